@@ -4,6 +4,7 @@ from blocksim.world import SimulationWorld
 from blocksim.dlasc_node_factory import NodeFactory
 from blocksim.dlasc_transaction_factory import TransactionFactory
 from blocksim.models.network import Network
+from blocksim.topology import create_topology
 
 
 def write_report(world):
@@ -72,9 +73,8 @@ def run_model():
     nodes_list = node_factory.create_nodes(miners, non_miners)
     # Start the network heartbeat
     world.env.process(network.start_heartbeat())
-    # Full Connect all nodes
-    for node in nodes_list:
-        node.connect(nodes_list)
+    # Connect the nodes with the topology of the configuration (a full mesh by default)
+    create_topology(world.env, nodes_list).connect(nodes_list)
 
     transaction_factory = TransactionFactory(world)
     transaction_factory.broadcast(10, 1, 1500, nodes_list)
@@ -1,5 +1,4 @@
 import string
-from random import randint, choices
 from blocksim.models.transaction import Transaction
 from blocksim.models.ethereum.transaction import Transaction as ETHTransaction
 import json
@@ -22,8 +21,11 @@ class TransactionFactory:
 
     def __init__(self, world):
         self._world = world
+        # Transactions created but not broadcast yet, which are counted in `created_transactions` when broadcast
+        self.pending_transactions = 0
 
     def broadcast(self, number_of_batches, transactions_per_batch, interval, nodes_list):
+        rng = self._world.env.rng.stream('transaction_factory')
         with open('../DLASC/src/tx_count.json') as f:
             # today = randint(0, 180 - 1)
             today = ' DAY 5 '
@@ -43,7 +45,7 @@ class TransactionFactory:
             for _i in range(sum_tx[i]):
                 # Generate a random string to a transaction be distinct from others
                 rand_sign = ''.join(
-                    choices(string.ascii_letters + string.digits, k=20))
+                    rng.choice(list(string.ascii_letters + string.digits), 20))
                 if self._world.blockchain == 'bitcoin':
                     tx = Transaction('address', 'address', 140, rand_sign, 50)
                 elif self._world.blockchain == 'ethereum':
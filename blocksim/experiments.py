@@ -0,0 +1,141 @@
+""" Replications of the permissioned (PBFT and PoA) simulations, run in parallel.
+
+The replications run in the worker processes of a `ProcessPoolExecutor`. A worker can run several
+of them, as each simulation starts from a fresh state (its random streams and its identity counter),
+so a replication only depends on its configuration and seed, whatever the order the runs are
+scheduled in. The workers import the main module, so a script must start the replications under
+a main guard. E.g. from the root of the repository:
+
+    from blocksim.experiments import run_replications
+
+    if __name__ == '__main__':
+        results = run_replications('dlasc-input-parameters/config.json', replications=10,
+                                   workload='tx_count_1000.json')
+        print(results['summary']['committed_transactions']['mean'])
+"""
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+import numpy as np
+from scipy import stats
+from blocksim.models.pbft_network import PBFTNetwork
+from blocksim.models.poa.poa_network import PoANetwork
+from blocksim.pbft_transaction_factory import PBFTTransactionFactory
+from blocksim.permissioned_node_factory import PermNodeFactory
+from blocksim.permissioned_transaction_factory import PermTransactionFactory
+from blocksim.termination import set_termination
+from blocksim.topology import create_topology
+from blocksim.world import SimulationWorld
+
+# Metrics of each replication, summarized over the replications
+METRICS = ('simulated_time', 'wall_time', 'blocks', 'committed_transactions')
+# Start of the simulated time of the replications, fixed so the runs do not depend on the clock
+INITIAL_TIME = 1600000000
+# Interval in seconds between the transaction batches of each protocol, as in the main scripts
+INJECTION_INTERVALS = {'pbft': 0.0001, 'poa': 0.1}
+
+
+def load_config(config):
+    """Returns the configuration `config`, either a dict or the path of a JSON file"""
+    if isinstance(config, dict):
+        return config
+    with open(config) as f:
+        return json.load(f)
+
+
+def run_replication(config: dict, seed: int, workload='tx_count_100.json', duration=100,
+                    input_parameters='dlasc-input-parameters'):
+    """Runs a simulation of the permissioned `config` with the `seed`, with the transactions of the
+    `workload` file of `supply-chain-input-data`, and returns its metrics:
+
+    - `simulated_time`: simulated seconds until the simulation ended (see `"termination"`)
+    - `wall_time`: seconds the simulation took to run
+    - `blocks`: height of the longest chain of the authorities
+    - `committed_transactions`: transactions in that chain
+    """
+    blockchain = config['blockchain']
+    if blockchain not in INJECTION_INTERVALS:
+        raise ValueError(f'Replications are only run for {tuple(INJECTION_INTERVALS)}, not {blockchain!r}')
+    start = perf_counter()
+    parameters = Path.cwd() / input_parameters
+    world = SimulationWorld(
+        duration,
+        INITIAL_TIME,
+        config,
+        parameters / 'latency.json',
+        parameters / 'throughput-received.json',
+        parameters / 'throughput-sent.json',
+        parameters / 'delays.json',
+        seed=seed)
+    network = (PBFTNetwork if blockchain == 'pbft' else PoANetwork)(world.env, 'NetworkXPTO')
+    nodes_list = PermNodeFactory(world, network).create_nodes({}, {})
+    world.env.process(network.start_heartbeat())
+    create_topology(world.env, nodes_list).connect(nodes_list)
+    transaction_factory = (PBFTTransactionFactory if blockchain == 'pbft' else PermTransactionFactory)(world)
+    transaction_factory.broadcast(workload, INJECTION_INTERVALS[blockchain], nodes_list)
+    network.transaction_factory = transaction_factory
+    set_termination(world, nodes_list, transaction_factory)
+    world.start_simulation()
+
+    chain = max((node.chain for node in nodes_list if node.is_authority), key=lambda c: c.head.header.number)
+    return {
+        'seed': seed,
+        'termination': world.env.data['termination'],
+        'simulated_time': world.env.now - INITIAL_TIME,
+        'wall_time': perf_counter() - start,
+        'blocks': chain.head.header.number,
+        'committed_transactions': sum(chain.get_block_by_number(number).transaction_count
+                                      for number in range(1, chain.head.header.number + 1))
+    }
+
+
+def summarize(runs: list, confidence=0.95):
+    """Returns the mean, the standard deviation and the Student's t confidence interval of the mean
+    of each metric of the `runs`"""
+    summary = {}
+    for metric in METRICS:
+        values = np.array([run[metric] for run in runs], dtype=float)
+        mean = values.mean()
+        std = values.std(ddof=1) if len(values) > 1 else math.nan
+        half_width = stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std / math.sqrt(len(values)) \
+            if len(values) > 1 else math.nan
+        summary[metric] = {
+            'mean': float(mean),
+            'std': float(std),
+            'ci_low': float(mean - half_width),
+            'ci_high': float(mean + half_width)
+        }
+    return summary
+
+
+def replication_seeds(config: dict, replications: int):
+    """Seeds of `replications` runs, following the `seed` of the configuration (0 by default)"""
+    base = config.get('seed') or 0
+    return [base + i for i in range(replications)]
+
+
+def run_replications(config, replications: int = None, seeds: list = None, workers: int = None,
+                     confidence=0.95, **kwargs):
+    """Runs a replication of the `config` (a dict or the path of a JSON file) for each of the
+    `seeds`, or for `replications` seeds following the seed of the configuration, on `workers`
+    processes (all the cores by default). The other arguments are passed to `run_replication`.
+
+    Returns the metrics of each run, in the order of the seeds, and their `summary`, with the
+    `confidence` interval of each mean."""
+    config = load_config(config)
+    if seeds is None:
+        if replications is None:
+            raise ValueError('Either the number of replications or the seeds must be given')
+        seeds = replication_seeds(config, replications)
+    workers = min(workers or os.cpu_count() or 1, len(seeds))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        runs = list(executor.map(partial(run_replication, config, **kwargs), seeds))
+    return {
+        'runs': runs,
+        'summary': summarize(runs, confidence),
+        'confidence': confidence
+    }
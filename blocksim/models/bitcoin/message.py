@@ -1,4 +1,12 @@
 from blocksim.utils import kB_to_MB
+from blocksim.models.message import message_type
+
+VersionMessage = message_type('version', '')
+VerackMessage = message_type('verack', '')
+InvMessage = message_type('inv', 'type hashes')
+TxMessage = message_type('tx', 'tx')
+BlockMessage = message_type('block', 'block')
+GetDataMessage = message_type('getdata', 'type hashes')
 
 
 class Message:
@@ -13,44 +21,38 @@ class Message:
         self._message_size = _env.config['bitcoin']['message_size_kB']
         # In bitcoin the header size has a fixed size https://en.bitcoin.it/wiki/Protocol_documentation#Message_structure
         self._header_size = self._message_size['header']
+        # Sizes in MB of the messages with a fixed size
+        self._version_size = kB_to_MB(self._header_size + self._message_size['version'])
+        self._verack_size = kB_to_MB(self._header_size + self._message_size['verack'])
+        self._tx_size = kB_to_MB(self._header_size + self._message_size['tx'])
 
     def version(self):
         """ When a node creates an outgoing connection, it will immediately advertise its version.
         https://en.bitcoin.it/wiki/Protocol_documentation#version"""
-        return {
-            'id': 'version',
-            'size': kB_to_MB(self._header_size + self._message_size['version'])
-        }
+        return VersionMessage(size=self._version_size)
 
     def verack(self):
         """ The verack message is sent in reply to version. This message consists of only
         a message header with the command string "verack".
         https://en.bitcoin.it/wiki/Protocol_documentation#verack"""
-        return {
-            'id': 'verack',
-            'size': kB_to_MB(self._header_size + self._message_size['verack'])
-        }
+        return VerackMessage(size=self._verack_size)
 
     def inv(self, hashes: list, _type: str):
         """Allows a node to advertise its knowledge of one or more transactions or blocks
         https://en.bitcoin.it/wiki/Protocol_documentation#inv"""
         num_items = len(hashes)
         inv_size = num_items * self._message_size['inv_vector']
-        return {
-            'id': 'inv',
-            'type': _type,
-            'hashes': hashes,
-            'size': kB_to_MB(self._header_size + inv_size)
-        }
+        return InvMessage(
+            type=_type,
+            hashes=hashes,
+            size=kB_to_MB(self._header_size + inv_size))
 
     def tx(self, tx):
         """Sends a bitcoin transaction, in reply to getdata
         https://en.bitcoin.it/wiki/Protocol_documentation#tx"""
-        return {
-            'id': 'tx',
-            'tx': tx,
-            'size': kB_to_MB(self._header_size + self._message_size['tx'])
-        }
+        return TxMessage(
+            tx=tx,
+            size=self._tx_size)
 
     def block(self, block):
         """Sends the body of a bitcoin block in response to a getdata message which
@@ -60,11 +62,9 @@ class Message:
         block_txs_size = self._message_size['tx'] * num_txs_block
         total_block_size = self._header_size + \
             self._message_size['block_base'] + block_txs_size
-        return {
-            'id': 'block',
-            'block': block,
-            'size': kB_to_MB(total_block_size)
-        }
+        return BlockMessage(
+            block=block,
+            size=kB_to_MB(total_block_size))
 
     def get_data(self, hashes: list, _type: str):
         """Used to retrieve the content of a specific type (e.g. block or transaction).
@@ -72,9 +72,7 @@ class Message:
         https://en.bitcoin.it/wiki/Protocol_documentation#getdata"""
         num_items = len(hashes)
         inv_size = num_items * self._message_size['inv_vector']
-        return {
-            'id': 'getdata',
-            'type': _type,
-            'hashes': hashes,
-            'size': kB_to_MB(self._header_size + inv_size)
-        }
+        return GetDataMessage(
+            type=_type,
+            hashes=hashes,
+            size=kB_to_MB(self._header_size + inv_size))
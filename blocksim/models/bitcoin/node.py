@@ -1,6 +1,7 @@
 from blocksim.models.node import Node
 from blocksim.models.network import Network
 from blocksim.models.bitcoin.message import Message
+from blocksim.models import message
 from blocksim.models.chain import Chain
 from blocksim.models.db import BaseDB
 from blocksim.models.consensus import Consensus
@@ -10,6 +11,15 @@ from blocksim.utils import time, get_random_values
 
 
 class BTCNode(Node):
+    HANDLERS = {
+        message.VERSION: '_receive_version',
+        message.VERACK: '_receive_verack',
+        message.INV: '_receive_inv',
+        message.GETDATA: '_receive_getdata',
+        message.BLOCK: '_receive_full_block',
+        message.TX: '_receive_full_transaction'
+    }
+
     def __init__(self,
                  env,
                  network: Network,
@@ -57,7 +67,7 @@ class BTCNode(Node):
         transactions_per_block_dist = self.env.config[
             'bitcoin']['number_transactions_per_block']
         transactions_per_block = int(
-            get_random_values(transactions_per_block_dist)[0])
+            get_random_values(transactions_per_block_dist, random_state=self.rng)[0])
         pending_txs = []
         for i in range(transactions_per_block * block_size):
             if self.transaction_queue.is_empty():
@@ -92,24 +102,19 @@ class BTCNode(Node):
         """It implements how bitcon P2P protocol works, more info here:
         https://bitcoin.org/en/developer-reference#p2p-network"""
         super()._read_envelope(envelope)
-        if envelope.msg['id'] == 'version':
-            self._receive_version(envelope)
-        if envelope.msg['id'] == 'verack':
-            self._receive_verack(envelope)
-        if envelope.msg['id'] == 'inv':
-            if envelope.msg['type'] == 'block':
-                self._receive_new_inv_blocks(envelope)
-            if envelope.msg['type'] == 'tx':
-                self._receive_new_inv_transactions(envelope)
-        if envelope.msg['id'] == 'getdata':
-            if envelope.msg['type'] == 'block':
-                self._send_full_blocks(envelope)
-            if envelope.msg['type'] == 'tx':
-                self._send_full_transactions(envelope)
-        if envelope.msg['id'] == 'block':
-            self._receive_full_block(envelope)
-        if envelope.msg['id'] == 'tx':
-            self._receive_full_transaction(envelope)
+        self._dispatch(envelope)
+
+    def _receive_inv(self, envelope):
+        if envelope.msg['type'] == 'block':
+            self._receive_new_inv_blocks(envelope)
+        if envelope.msg['type'] == 'tx':
+            self._receive_new_inv_transactions(envelope)
+
+    def _receive_getdata(self, envelope):
+        if envelope.msg['type'] == 'block':
+            self._send_full_blocks(envelope)
+        if envelope.msg['type'] == 'tx':
+            self._send_full_transactions(envelope)
 
     ##              ##
     ## Handshake    ##
@@ -117,8 +122,13 @@ class BTCNode(Node):
 
     def connect(self, nodes: list):
         super().connect(nodes)
-        for node in nodes:
-            self._send_version(node.address)
+        # With lazy connections, the handshake is sent when the session is opened
+        if not self.lazy_connections:
+            for node in nodes:
+                self._send_version(node.address)
+
+    def _handshake(self, destination_address: str):
+        self._send_version(destination_address)
 
     def _send_version(self, destination_address: str):
         """When a node creates an outgoing connection, it will immediately advertise its version"""
@@ -165,13 +175,16 @@ class BTCNode(Node):
         """Broadcast transactions to all nodes with an active session and mark the hashes
         as known by each node"""
         yield self.connecting  # Wait for all connections
-        for node_address, node in self.active_sessions.items():
+        transactions_hashes = []
+        for node_address in self.peers:
+            # A peer without a session yet knows none of the transactions
+            node = self.active_sessions.get(node_address)
             transactions_hashes = []
             for tx in transactions:
                 # Add the transaction to a temporary list
                 self.temp_txs[tx.hash] = tx
                 # Checks if the transaction was previous sent
-                if any({tx.hash} & node.get('knownTxs')):
+                if node is not None and any({tx.hash} & node.get('knownTxs')):
                     if self.verbose:
                         print(
                             f'{self.address} at {time(self.env)}: Transaction {tx.hash[:8]} was already sent to {node_address}')
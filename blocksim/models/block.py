@@ -1,6 +1,6 @@
 import time
 from datetime import datetime
-from blocksim.utils import keccak_256, encode_hex
+from blocksim.utils import encode_hex, get_identity
 
 
 class BlockHeader:
@@ -32,8 +32,20 @@ class BlockHeader:
 
     @property
     def hash(self):
-        """The block header hash"""
-        return encode_hex(keccak_256(str(self).encode('utf-8')))
+        """The block header hash (or a sequential identity, see `set_identity_mode`), computed once.
+        After that the block header can not be changed, so the hash is always valid."""
+        try:
+            return self._hash
+        except AttributeError:
+            # Every node creates its own genesis block, they must all have the same identity
+            self._hash = get_identity(self, 0 if self.number == 0 else None)
+            return self._hash
+
+    def __setattr__(self, name, value):
+        if '_hash' in self.__dict__:
+            raise AttributeError(
+                f'{self.__class__.__name__} is immutable once its hash is computed, can not set {name}')
+        super().__setattr__(name, value)
 
     def __repr__(self):
         """Returns a unambiguous representation of the block header"""
@@ -53,20 +65,22 @@ class BlockHeader:
         return not self.__eq__(other)
 
     def __hash__(self):
-        return self.hash
+        return hash(self.hash)
 
 
 class Block:
     """ Defines the Block model.
 
+    A block is never changed after it is built, so the same object can be shared by all the nodes.
+
     :param header: the block header
-    :param transactions: a list of transactions
+    :param transactions: a list of transactions, or the rows of the transaction table (a `range` or an array)
+    :param float size: the size of the block body in megabytes (MB), when known at build time
     """
 
-    def __init__(self, header: BlockHeader, transactions=None):
+    def __init__(self, header: BlockHeader, transactions=None, size=None):
         self.header = header
         self.transactions = transactions
-
-    @property
-    def transaction_count(self):
-        return len(self.transactions)
+        # Computed once, so the messages with the block do not go through its transactions
+        self.transaction_count = len(transactions) if transactions is not None else 0
+        self.size = size
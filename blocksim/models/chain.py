@@ -1,4 +1,3 @@
-import random
 import itertools
 from blocksim.utils import time
 
@@ -57,28 +56,16 @@ class Chain:
     def add_child(self, child):
         """Add a record allowing you to later look up the provided block's
         parent hash and see that it is one of its children"""
-        try:
-            existing = self.db.get('child:' + child.header.prevhash)
-        except BaseException:
-            existing = ''
-        existing_hashes = []
-        for i in range(0, len(existing), 32):
-            existing_hashes.append(existing[i: i + 32])
-        if child.header.hash not in existing_hashes:
-            self.db.put(
-                'child:' + child.header.prevhash,
-                existing + child.header.hash)
+        key = f'child:{child.header.prevhash}'
+        child_hashes = self.db.get(key) if key in self.db else []
+        if child.header.hash not in child_hashes:
+            child_hashes.append(child.header.hash)
+            self.db.put(key, child_hashes)
 
     def get_child_hashes(self, block_hash):
         """Get the hashes of all known children of a given block"""
-        child_hashes = []
-        try:
-            data = self.db.get('child:' + block_hash)
-            for i in range(0, len(data), 32):
-                child_hashes.append(data[i:i + 32])
-            return child_hashes
-        except BaseException:
-            return []
+        key = f'child:{block_hash}'
+        return list(self.db.get(key)) if key in self.db else []
 
     def get_pow_difficulty(self, block):
         """Get the total difficulty in PoW of a given block"""
@@ -95,7 +82,7 @@ class Chain:
         score = int(self.db.get(key))
         for h, d in fills:
             key = f'score:{h}'
-            score = score + d + random.randrange(10**6 + 1)
+            score = score + d + int(self.env.rng.stream('chain', self.node.address).integers(10**6 + 1))
             self.db.put(key, str(score))
         return score
 
@@ -183,6 +170,7 @@ class Chain:
         self.add_child(block)
 
         self.db.put(block.header.hash, block)
+        self.env.check_stop_conditions()
 
         # Are there blocks that we received that were waiting for this block?
         # If so, process them.
@@ -1,5 +1,3 @@
-from blocksim.utils import get_random_values
-
 
 class Consensus:
     """ Defines the consensus model.
@@ -23,13 +21,11 @@ class Consensus:
     def validate_block(self, block=None):
         """ Simulates the block validation.
         For now, it only applies a delay in simulation, corresponding to previous measurements"""
-        delay = round(get_random_values(
-            self.env.delays['block_validation'])[0], 4)
+        delay = round(self.env.delays['block_validation'].sample(), 4)
         return delay
 
     def validate_transaction(self, tx=None):
         """ Simulates the transaction validation.
         For now, it only calculates a delay in simulation, corresponding to previous measurements"""
-        delay = round(get_random_values(
-            self.env.delays['tx_validation'])[0], 4)
+        delay = round(self.env.delays['tx_validation'].sample(), 4)
         return delay
@@ -7,9 +7,20 @@ from blocksim.models.transaction_queue import TransactionQueue
 from blocksim.utils import time
 from blocksim.models.ethereum.block import Block, BlockHeader
 from blocksim.models.ethereum.message import Message
+from blocksim.models import message
 
 
 class ETHNode(Node):
+    HANDLERS = {
+        message.STATUS: '_receive_status',
+        message.NEW_BLOCKS: '_receive_new_blocks',
+        message.TRANSACTIONS: '_receive_full_transactions',
+        message.GET_HEADERS: '_send_block_headers',
+        message.BLOCK_HEADERS: '_receive_block_headers',
+        message.GET_BLOCK_BODIES: '_send_block_bodies',
+        message.BLOCK_BODIES: '_receive_block_bodies'
+    }
+
     def __init__(self,
                  env,
                  network: Network,
@@ -91,20 +102,7 @@ class ETHNode(Node):
 
     def _read_envelope(self, envelope):
         super()._read_envelope(envelope)
-        if envelope.msg['id'] == 'status':
-            self._receive_status(envelope)
-        if envelope.msg['id'] == 'new_blocks':
-            self._receive_new_blocks(envelope)
-        if envelope.msg['id'] == 'transactions':
-            self._receive_full_transactions(envelope)
-        if envelope.msg['id'] == 'get_headers':
-            self._send_block_headers(envelope)
-        if envelope.msg['id'] == 'block_headers':
-            self._receive_block_headers(envelope)
-        if envelope.msg['id'] == 'get_block_bodies':
-            self._send_block_bodies(envelope)
-        if envelope.msg['id'] == 'block_bodies':
-            self._receive_block_bodies(envelope)
+        self._dispatch(envelope)
 
     ##              ##
     ## Handshake    ##
@@ -112,8 +110,10 @@ class ETHNode(Node):
 
     def connect(self, nodes: list):
         super().connect(nodes)
-        for node in nodes:
-            self._handshake(node.address)
+        # With lazy connections, the handshake is sent when the session is opened
+        if not self.lazy_connections:
+            for node in nodes:
+                self._handshake(node.address)
 
     def _handshake(self, destination_address: str):
         """Handshake inform a node of its current ethereum state, negotiating network, difficulties,
@@ -129,9 +129,8 @@ class ETHNode(Node):
         if self.verbose:
             print(
                 f'{self.address} at {time(self.env)}: Receive status from {envelope.origin.address}')
-        node = self.active_sessions.get(envelope.origin.address)
+        node = self._session(envelope.origin.address)
         node['status'] = envelope.msg
-        self.active_sessions[envelope.origin.address] = node
         self._handshaking.succeed()
         self._handshaking = self.env.event()
 
@@ -144,7 +143,7 @@ class ETHNode(Node):
         as known by each node"""
         yield self.connecting  # Wait for all connections
         yield self._handshaking  # Wait for handshaking to be completed
-        for node_address, node in self.active_sessions.items():
+        for node_address, node in self._sessions():
             for tx in transactions:
                 # Checks if the transaction was previous sent
                 if any({tx.hash} & node.get('knownTxs')):
@@ -1,4 +1,13 @@
 from blocksim.utils import kB_to_MB
+from blocksim.models.message import message_type
+
+StatusMessage = message_type('status', 'protocol_version network td best_hash genesis_hash')
+NewBlocksMessage = message_type('new_blocks', 'new_blocks')
+TransactionsMessage = message_type('transactions', 'transactions')
+GetHeadersMessage = message_type('get_headers', 'block_number max_headers')
+BlockHeadersMessage = message_type('block_headers', 'block_headers')
+GetBlockBodiesMessage = message_type('get_block_bodies', 'hashes')
+BlockBodiesMessage = message_type('block_bodies', 'block_bodies')
 
 
 class Message:
@@ -13,32 +22,30 @@ class Message:
         self.origin_node = origin_node
         _env = origin_node.env
         self._message_size = _env.config['ethereum']['message_size_kB']
+        # Sizes in MB of the messages with a fixed size
+        self._size = {name: kB_to_MB(size) for name, size in self._message_size.items()}
         self.verbose = verbose
 
     def status(self):
         """ Inform a peer of its current Ethereum state.
         This message should be sent `after` the initial handshake and `prior` to any ethereum related messages.
         """
-        return {
-            'id': 'status',
-            'protocol_version': 'PV62',
-            'network': self.origin_node.network.name,
-            'td': self.origin_node.chain.head.header.difficulty,
-            'best_hash': self.origin_node.chain.head.header.hash,
-            'genesis_hash': self.origin_node.chain.genesis.header.hash,
-            'size': kB_to_MB(self._message_size['status'])
-        }
+        return StatusMessage(
+            protocol_version='PV62',
+            network=self.origin_node.network.name,
+            td=self.origin_node.chain.head.header.difficulty,
+            best_hash=self.origin_node.chain.head.header.hash,
+            genesis_hash=self.origin_node.chain.genesis.header.hash,
+            size=self._size['status'])
 
     def new_blocks(self, new_blocks: dict):
         """Advertises one or more new blocks which have appeared on the network"""
         num_new_block_hashes = len(new_blocks)
         new_blocks_size = num_new_block_hashes * \
             self._message_size['hash_size']
-        return {
-            'id': 'new_blocks',
-            'new_blocks': new_blocks,
-            'size': kB_to_MB(new_blocks_size)
-        }
+        return NewBlocksMessage(
+            new_blocks=new_blocks,
+            size=kB_to_MB(new_blocks_size))
 
     def transactions(self, transactions: list):
         """ Specify (a) transaction(s) that the peer should make sure is included on its
@@ -47,19 +54,15 @@ class Message:
         """
         num_txs = len(transactions)
         transactions_size = num_txs * self._message_size['tx']
-        return {
-            'id': 'transactions',
-            'transactions': transactions,
-            'size': kB_to_MB(transactions_size)
-        }
+        return TransactionsMessage(
+            transactions=transactions,
+            size=kB_to_MB(transactions_size))
 
     def get_headers(self, block_number: int, max_headers: int):
-        return {
-            'id': 'get_headers',
-            'block_number': block_number,
-            'max_headers': max_headers,
-            'size': kB_to_MB(self._message_size['get_headers'])
-        }
+        return GetHeadersMessage(
+            block_number=block_number,
+            max_headers=max_headers,
+            size=self._size['get_headers'])
 
     def block_headers(self, block_headers: list):
         """ Reply to `get_headers` the items in the list are block headers.
@@ -68,19 +71,15 @@ class Message:
         """
         num_headers = len(block_headers)
         block_headers_size = num_headers * self._message_size['header']
-        return {
-            'id': 'block_headers',
-            'block_headers': block_headers,
-            'size': kB_to_MB(block_headers_size)
-        }
+        return BlockHeadersMessage(
+            block_headers=block_headers,
+            size=kB_to_MB(block_headers_size))
 
     def get_block_bodies(self, hashes: list):
         block_bodies_size = len(hashes) * self._message_size['hash_size']
-        return {
-            'id': 'get_block_bodies',
-            'hashes': hashes,
-            'size': kB_to_MB(block_bodies_size)
-        }
+        return GetBlockBodiesMessage(
+            hashes=hashes,
+            size=kB_to_MB(block_bodies_size))
 
     def block_bodies(self, block_bodies: dict):
         """ Reply to `get_block_bodies`. The items in the list are some of the blocks, minus the header.
@@ -94,8 +93,6 @@ class Message:
         if self.verbose:
             print(
                 f'block bodies with {txsCount} txs have a message size: {message_size} kB')
-        return {
-            'id': 'block_bodies',
-            'block_bodies': block_bodies,
-            'size': kB_to_MB(message_size)
-        }
+        return BlockBodiesMessage(
+            block_bodies=block_bodies,
+            size=kB_to_MB(message_size))
@@ -1,5 +1,4 @@
 from blocksim.models.transaction import Transaction as BaseTransaction
-from blocksim.utils import keccak_256, encode_hex
 
 
 class Transaction(BaseTransaction):
@@ -30,11 +29,6 @@ class Transaction(BaseTransaction):
         self.gasprice = gasprice
         self.startgas = startgas
 
-    @property
-    def hash(self):
-        """The transaction hash calculated using Keccak 256"""
-        return encode_hex(keccak_256(str(self).encode('utf-8')))
-
     def __lt__(self, other):
         return isinstance(other, self.__class__) and self.gasprice < other.gasprice
 
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+# Integer opcodes of the network messages of all the blockchains
+(STATUS, TRANSACTIONS, NEW_BLOCKS, GET_HEADERS, BLOCK_HEADERS, GET_BLOCK_BODIES, BLOCK_BODIES,
+ VERSION, VERACK, INV, TX, BLOCK, GETDATA,
+ PRE_PREPARE, PREPARE, COMMIT, REPLY, CHECKPOINT, VIEWCHANGE, NEWVIEW,
+ BUNDLE) = range(21)
+
+OPCODES = {
+    'status': STATUS,
+    'transactions': TRANSACTIONS,
+    'new_blocks': NEW_BLOCKS,
+    'get_headers': GET_HEADERS,
+    'block_headers': BLOCK_HEADERS,
+    'get_block_bodies': GET_BLOCK_BODIES,
+    'block_bodies': BLOCK_BODIES,
+    'version': VERSION,
+    'verack': VERACK,
+    'inv': INV,
+    'tx': TX,
+    'block': BLOCK,
+    'getdata': GETDATA,
+    'pre-prepare': PRE_PREPARE,
+    'prepare': PREPARE,
+    'commit': COMMIT,
+    'reply': REPLY,
+    'checkpoint': CHECKPOINT,
+    'viewchange': VIEWCHANGE,
+    'newview': NEWVIEW,
+    'bundle': BUNDLE
+}
+
+
+class MessageRecord:
+    """ Base of the network messages. Each type of message is an immutable record with a field for
+    each of its values and the `size` in megabytes (MB), see `message_type`. The record is shared by
+    all the destinations of a broadcast.
+
+    The message name and its integer `opcode` are attributes of the type. Messages can also be read
+    as the dictionaries they replace, e.g. `msg['id']` or `msg.get('seqno')`.
+    """
+
+    __slots__ = ()
+    id = None
+    opcode = None
+    # Keys of the message read as a dictionary: its fields, the name and the opcode, so the
+    # methods of the tuple (e.g. `count` or `index`) are not keys
+    KEYS = frozenset(('id', 'opcode'))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self.KEYS:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+
+def message_type(name: str, fields: str):
+    """Creates the record type of the message `name`, with the space-separated `fields` and `size`"""
+    type_name = name.title().replace('-', '').replace('_', '') + 'Message'
+    record = namedtuple(type_name, fields.split() + ['size'])
+    return type(type_name, (MessageRecord, record), {
+        '__slots__': (),
+        'id': name,
+        'opcode': OPCODES[name],
+        'KEYS': MessageRecord.KEYS | set(record._fields)
+    })
+
+
+BundleMessage = message_type('bundle', 'messages')
+
+
+def bundle(messages: list):
+    """Bundles the `messages` sent to the same peer in a single message, with the sum of their sizes"""
+    return BundleMessage(messages=tuple(messages), size=sum(msg.size for msg in messages))
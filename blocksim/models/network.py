@@ -1,6 +1,4 @@
-import scipy
-from simpy import Store
-from blocksim.utils import get_random_values, time, get_latency_delay
+from blocksim.utils import get_random_values, time, get_latency_delay, get_received_delay
 
 
 class Network:
@@ -13,6 +11,8 @@ class Network:
         self._list_nodes = []
         self._list_probabilities = []
         self.verbose = self.env.config["verbose"]
+        # Random stream used to select the nodes that broadcast their candidate blocks
+        self.rng = self.env.rng.stream('network', name)
 
     def get_node(self, address):
         return self._nodes.get(address)
@@ -46,21 +46,20 @@ class Network:
         """
         self._init_lists()
         while True:
-            time_between_blocks = round(get_random_values(
-                self.env.delays['time_between_blocks_seconds'])[0], 2)
+            time_between_blocks = round(self.env.delays['time_between_blocks_seconds'].sample(), 2)
             yield self.env.timeout(time_between_blocks)
             orphan_blocks_probability = self.env.config[self.blockchain]['orphan_blocks_probability']
-            simulate_orphan_blocks = scipy.random.choice(
+            simulate_orphan_blocks = self.rng.choice(
                 [True, False], 1, p=[orphan_blocks_probability, 1-orphan_blocks_probability])[0]
             if simulate_orphan_blocks:
-                selected_nodes = scipy.random.choice(
-                    self._list_nodes, 2, replace=False, p=self._list_probabilities)
-                for selected_node in selected_nodes:
-                    self._build_new_block(selected_node)
+                selected_indexes = self.rng.choice(
+                    len(self._list_nodes), 2, replace=False, p=self._list_probabilities)
+                for selected_index in selected_indexes:
+                    self._build_new_block(self._list_nodes[selected_index])
             else:
-                selected_node = scipy.random.choice(
-                    self._list_nodes, 1, replace=False, p=self._list_probabilities)[0]
-                self._build_new_block(selected_node)
+                selected_index = self.rng.choice(
+                    len(self._list_nodes), 1, replace=False, p=self._list_probabilities)[0]
+                self._build_new_block(self._list_nodes[selected_index])
 
     def _build_new_block(self, node):
         if self.verbose:
@@ -71,26 +70,81 @@ class Network:
 
 
 class Connection:
-    """This class represents the propagation through a Connection."""
+    """This class represents the propagation through a Connection.
+
+    A connection carries the messages of its origin to the inbox of its destination node, which
+    downloads the messages of each origin one at a time. Messages that arrive before the
+    connection is `open` (see `Node._connecting`) wait for it, in order."""
 
     def __init__(self, env, origin_node, destination_node):
         self.env = env
-        self.store = Store(env)
         self.origin_node = origin_node
         self.destination_node = destination_node
         self.verbose = self.env.config["verbose"]
-
-    def latency(self, envelope):
-        latency_delay = get_latency_delay(
-            self.env, self.origin_node.location, self.destination_node.location)
-        yield self.env.timeout(latency_delay)
-        self.store.put(envelope)
-
-    def put(self, envelope):
+        self.is_open = False
+        # Messages that arrive before the connection is open, and whether they are downloaded
+        self._pending = []
+        # Time when the destination finishes receiving the last message of the connection
+        self._received_until = 0
+
+    def put(self, envelope, latency_delay=None):
+        """Sends the `envelope` through the connection, the destination downloads it when it arrives.
+        The `latency_delay` can be given when it was already sampled"""
         if self.verbose:
             print(
                 f'{envelope.origin.address} at {envelope.timestamp}: Message (ID: {envelope.msg["id"]}) sent with {envelope.msg["size"]} MB with a destination: {envelope.destination.address}')
-        self.env.process(self.latency(envelope))
-
-    def get(self):
-        return self.store.get()
+        self.destination_node.in_flight += 1
+        if latency_delay is None:
+            latency_delay = get_latency_delay(
+                self.env, self.origin_node.location, self.destination_node.location)
+        self._schedule(latency_delay, self._arrive, envelope)
+
+    def deliver(self, envelope, latency_delay, received_delay):
+        """Sends the `envelope` through the connection, which hands it to the destination already
+        downloaded, after a single timeout. As in `put`, the destination downloads the messages of
+        a connection one at a time, so a message waits for the download of the previous one."""
+        if self.verbose:
+            print(
+                f'{envelope.origin.address} at {envelope.timestamp}: Message (ID: {envelope.msg["id"]}) sent with {envelope.msg["size"]} MB with a destination: {envelope.destination.address}')
+        self.destination_node.in_flight += 1
+        arrival = self.env.now + latency_delay
+        self._received_until = max(arrival, self._received_until) + received_delay
+        self._schedule(self._received_until - self.env.now, self._downloaded, envelope)
+
+    def open(self):
+        """Opens the connection, the messages that arrived before are received in order"""
+        self.is_open = True
+        pending, self._pending = self._pending, []
+        for envelope, downloaded in pending:
+            if downloaded:
+                self._receive(envelope)
+            else:
+                self._download(envelope)
+
+    def _schedule(self, delay, callback, envelope):
+        """Calls `callback` with a timeout carrying the `envelope` after `delay`, instead of starting
+        a process per message. Timeouts at the same time are processed in the order they were
+        scheduled, so the messages of a connection keep their order."""
+        self.env.timeout(delay, envelope).callbacks.append(callback)
+
+    def _arrive(self, event):
+        if not self.is_open:
+            self._pending.append((event.value, False))
+            return
+        self._download(event.value)
+
+    def _download(self, envelope):
+        received_delay = get_received_delay(
+            self.env, envelope.msg['size'], self.origin_node.location, self.destination_node.location)
+        self._received_until = max(self.env.now, self._received_until) + received_delay
+        self._schedule(self._received_until - self.env.now, self._downloaded, envelope)
+
+    def _downloaded(self, event):
+        if not self.is_open:
+            self._pending.append((event.value, True))
+            return
+        self._receive(event.value)
+
+    def _receive(self, envelope):
+        self.destination_node.in_flight -= 1
+        self.destination_node.inbox.put(envelope)
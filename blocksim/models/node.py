@@ -1,8 +1,10 @@
 from collections import namedtuple
+from time import perf_counter
+from simpy import Store
 from blocksim.models.network import Connection, Network
 from blocksim.models.chain import Chain
 from blocksim.models.consensus import Consensus
-from blocksim.utils import get_received_delay, get_sent_delay, get_latency_delay, time
+from blocksim.utils import get_sent_delay, get_latency_delay, monitor_key, time
 
 Envelope = namedtuple('Envelope', 'msg, timestamp, destination, origin')
 
@@ -24,8 +26,22 @@ class Node:
     `location`.
 
     In order to a node to be identified in the network simulation, is needed to have an `address`
+
+    Each node model declares the `HANDLERS` of the messages it receives, by message opcode, and the
+    opcodes in `AUTHORITY_HANDLERS` are only handled by authority nodes. The handlers are looked up
+    once per class, and bound once per node, so a received message is dispatched by a single lookup.
     """
 
+    # Name of the method that handles each message opcode (see `blocksim.models.message`)
+    HANDLERS = {}
+    # Opcodes of the messages that are only handled when the node is an authority
+    AUTHORITY_HANDLERS = frozenset()
+    _handler_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handler_table = {opcode: getattr(cls, name) for opcode, name in cls.HANDLERS.items()}
+
     def __init__(self,
                  env,
                  network: Network,
@@ -39,36 +55,79 @@ class Node:
         self.address = address
         self.chain = chain
         self.consensus = consensus
+        # Nodes this node is connected to, by address, and the sessions opened with them
+        self.peers = {}
         self.active_sessions = {}
         self.connecting = None
+        # Open the session with a peer on its first use, instead of when connecting (see `_session`)
+        self.lazy_connections = env.config.get('lazy_connections', False)
         # Join the node to the network
         self.network.add_node(self)
         # Set the monitor to count the forks during the simulation
         key = f'forks_{address}'
         self.env.data[key] = 0
         self.verbose = self.env.config["verbose"]
+        # Random stream of the node (e.g. number of transactions per block, dropped messages)
+        self.rng = self.env.rng.stream('node', address)
+        self._handlers = {opcode: handler.__get__(self) for opcode, handler in self._handler_table.items()}
+        self._profiler = getattr(env, 'profiler', None)
+        # Inbox of the messages received from all the connections, already downloaded
+        self.inbox = Store(env)
+        # Messages sent to the node that are not in its inbox yet
+        self.in_flight = 0
+        self.env.process(self.listening_node())
 
     def connect(self, nodes: list):
         """Simulate an acknowledgement phase with given nodes. During simulation the nodes
-        will have an active session."""
+        will have an active session.
+
+        With lazy connections, the session with a node is only opened, and the acknowledgement
+        phase simulated, when the first message is sent to it."""
         for node in nodes:
             # Ignore when a node is trying to connect to itself
             if node.address != self.address:
-                connection = Connection(self.env, self, node)
-
-                # Set the bases to monitor the block & TX propagation
-                self.env.data['block_propagation'].update({
-                    f'{self.address}_{node.address}': {}})
-                self.env.data['tx_propagation'].update({
-                    f'{self.address}_{node.address}': {}})
-
-                self.active_sessions[node.address] = {
-                    'connection': connection,
-                    'knownTxs': {''},
-                    'knownBlocks': {''}
-                }
-                self.connecting = self.env.process(
-                    self._connecting(node, connection))
+                self.peers[node.address] = node
+                if not self.lazy_connections:
+                    self._open_session(node)
+        if self.lazy_connections and self.connecting is None:
+            # There are no connections to wait for
+            self.connecting = self.env.event().succeed()
+
+    def _open_session(self, node):
+        connection = Connection(self.env, self, node)
+
+        # Set the bases to monitor the block & TX propagation
+        self.env.data['block_propagation'].update({
+            f'{self.address}_{node.address}': {}})
+        self.env.data['tx_propagation'].update({
+            f'{self.address}_{node.address}': {}})
+
+        session = self.active_sessions[node.address] = {
+            'connection': connection,
+            'knownTxs': {''},
+            'knownBlocks': {''}
+        }
+        connecting = self.env.process(self._connecting(node, connection))
+        if self.lazy_connections:
+            self._handshake(node.address)
+        else:
+            self.connecting = connecting
+        return session
+
+    def _handshake(self, destination_address: str):
+        """Sends the first message of the protocol to a new peer, implemented by the node models"""
+        pass
+
+    def _session(self, node_address: str):
+        """Returns the session with the peer `node_address`, opening it on its first use"""
+        session = self.active_sessions.get(node_address)
+        if session is None:
+            session = self._open_session(self.peers[node_address])
+        return session
+
+    def _sessions(self):
+        """Yields the address and the session of every peer with an open session"""
+        yield from list(self.active_sessions.items())
 
     def _connecting(self, node, connection):
         """Simulates the time needed to perform TCP handshake and acknowledgement phase.
@@ -82,12 +141,14 @@ class Node:
             self.env, origin_node.location, destination_node.location)
         tcp_handshake_delay = 3*latency
         yield self.env.timeout(tcp_handshake_delay)
-        self.env.process(destination_node.listening_node(connection))
+        connection.open()
 
     def _mark_block(self, block_hash: str, node_address: str):
         """Marks a block as known for a specific node, ensuring that it will never be
-        propagated again."""
+        propagated again. Peers without a session are skipped, they are not opened for it."""
         node = self.active_sessions.get(node_address)
+        if node is None:
+            return
         known_blocks = node.get('knownBlocks')
         while len(known_blocks) >= MAX_KNOWN_BLOCKS:
             known_blocks.pop()
@@ -97,8 +158,10 @@ class Node:
 
     def _mark_transaction(self, tx_hash: str, node_address: str):
         """Marks a transaction as known for a specific node, ensuring that it will never be
-        propagated again."""
+        propagated again. Peers without a session are skipped, they are not opened for it."""
         node = self.active_sessions.get(node_address)
+        if node is None:
+            return
         known_txs = node.get('knownTxs')
         while len(known_txs) >= MAX_KNOWN_TXS:
             known_txs.pop()
@@ -112,48 +175,60 @@ class Node:
             print(
                 f'{self.address} at {time(self.env)}: Receive a message (ID: {envelope.msg["id"]}) created at {envelope.timestamp} from {envelope.origin.address}')
 
-    def listening_node(self, connection):
+    def _dispatch(self, envelope):
+        """Calls the handler of the message in `envelope`, if the node handles it. When profiling,
+        the profiler counts the messages and the wall-clock time spent by the handler"""
+        msg = envelope.msg
+        handler = self._handlers.get(msg.opcode)
+        if handler is None or (msg.opcode in self.AUTHORITY_HANDLERS and not self.is_authority):
+            return
+        if self._profiler is None:
+            handler(envelope)
+            return
+        start = perf_counter()
+        handler(envelope)
+        self._profiler.count_message(self.address, msg.id, perf_counter() - start)
+
+    def listening_node(self):
         while True:
-            # Get the messages from  connection
-            envelope = yield connection.get()
-            origin_loc = envelope.origin.location
-            dest_loc = envelope.destination.location
-            message_size = envelope.msg['size']
-            received_delay = get_received_delay(
-                self.env, message_size, origin_loc, dest_loc)
-            yield self.env.timeout(received_delay)
-
-            # Monitor the transaction propagation on Ethereum
-            if envelope.msg['id'] == 'transactions':
-                tx_propagation = self.env.data['tx_propagation'][
-                    f'{envelope.origin.address}_{envelope.destination.address}']
-                txs = {}
-                for tx in envelope.msg['transactions']:
-                    initial_time = tx_propagation.get(tx.hash[:8], None)
-                    if initial_time is not None:
-                        propagation_time = self.env.now - initial_time
-                        txs.update({f'{tx.hash[:8]}': propagation_time})
-                self.env.data['tx_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
-                    txs)
-            # Monitor the block propagation on Ethereum
-            if envelope.msg['id'] == 'block_bodies':
-                block_propagation = self.env.data['block_propagation'][
-                    f'{envelope.origin.address}_{envelope.destination.address}']
-                blocks = {}
-                for block_hash, _ in envelope.msg['block_bodies'].items():
-                    initial_time = block_propagation.get(block_hash[:8], None)
-                    if initial_time is not None:
-                        propagation_time = self.env.now - initial_time
-                        blocks.update({f'{block_hash[:8]}': propagation_time})
-                self.env.data['block_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
-                    blocks)
+            # Get the messages of all the connections, they are downloaded by the connection
+            # (see `Connection.put`)
+            envelope = yield self.inbox.get()
 
+            self._monitor_received(envelope)
             self._read_envelope(envelope)
 
+    def _monitor_received(self, envelope):
+        """Records the propagation time of the transactions and blocks received in `envelope`"""
+        # Monitor the transaction propagation on Ethereum
+        if envelope.msg['id'] == 'transactions':
+            tx_propagation = self.env.data['tx_propagation'][
+                f'{envelope.origin.address}_{envelope.destination.address}']
+            txs = {}
+            for tx in envelope.msg['transactions']:
+                initial_time = tx_propagation.get(monitor_key(tx.hash), None)
+                if initial_time is not None:
+                    propagation_time = self.env.now - initial_time
+                    txs.update({monitor_key(tx.hash): propagation_time})
+            self.env.data['tx_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
+                txs)
+        # Monitor the block propagation on Ethereum
+        if envelope.msg['id'] == 'block_bodies':
+            block_propagation = self.env.data['block_propagation'][
+                f'{envelope.origin.address}_{envelope.destination.address}']
+            blocks = {}
+            for block_hash, _ in envelope.msg['block_bodies'].items():
+                initial_time = block_propagation.get(monitor_key(block_hash), None)
+                if initial_time is not None:
+                    propagation_time = self.env.now - initial_time
+                    blocks.update({monitor_key(block_hash): propagation_time})
+            self.env.data['block_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
+                blocks)
+
     def send(self, destination_address: str, msg):
         if self.address == destination_address:
             return
-        node = self.active_sessions[destination_address]
+        node = self._session(destination_address)
         active_connection = node['connection']
         origin_node = active_connection.origin_node
         destination_node = active_connection.destination_node
@@ -187,26 +262,13 @@ class Node:
         active_connection.put(envelope)
 
     def broadcast(self, msg):
-        """Broadcast a message to all nodes with an active session"""
-        for add, node in self.active_sessions.items():
-            connection = node['connection']
+        """Broadcast a message to all the peers, opening the sessions not used yet"""
+        for add in self.peers:
+            connection = self._session(add)['connection']
             origin_node = connection.origin_node
             destination_node = connection.destination_node
 
-            # Monitor the transaction propagation on Ethereum
-            if msg['id'] == 'transactions':
-                txs = {}
-                for tx in msg['transactions']:
-                    txs.update({f'{tx.hash[:8]}': self.env.now})
-                self.env.data['tx_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    txs)
-            # Monitor the block propagation on Ethereum
-            if msg['id'] == 'new_blocks':
-                blocks = {}
-                for block_hash in msg['new_blocks']:
-                    blocks.update({f'{block_hash[:8]}': self.env.now})
-                self.env.data['block_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    blocks)
+            self._monitor_sent(msg, destination_node)
 
             upload_transmission_delay = get_sent_delay(
                 self.env, msg['size'], origin_node.location, destination_node.location)
@@ -214,3 +276,20 @@ class Node:
             envelope = Envelope(msg, time(self.env),
                                 destination_node, origin_node)
             connection.put(envelope)
+
+    def _monitor_sent(self, msg, destination_node):
+        """Records the time when the transactions and blocks in `msg` are sent to `destination_node`"""
+        # Monitor the transaction propagation on Ethereum
+        if msg['id'] == 'transactions':
+            txs = {}
+            for tx in msg['transactions']:
+                txs.update({monitor_key(tx.hash): self.env.now})
+            self.env.data['tx_propagation'][f'{self.address}_{destination_node.address}'].update(
+                txs)
+        # Monitor the block propagation on Ethereum
+        if msg['id'] == 'new_blocks':
+            blocks = {}
+            for block_hash in msg['new_blocks']:
+                blocks.update({monitor_key(block_hash): self.env.now})
+            self.env.data['block_propagation'][f'{self.address}_{destination_node.address}'].update(
+                blocks)
@@ -1,5 +1,17 @@
 from blocksim.utils import kB_to_MB
 from blocksim.models.pbft_network import MaliciousModel
+from blocksim.models.message import message_type
+
+StatusMessage = message_type('status', 'protocol_version network td best_hash genesis_hash')
+TransactionsMessage = message_type('transactions', 'transactions')
+PrePrepareMessage = message_type('pre-prepare', 'view seqno digest new_blocks block_bodies')
+PrepareMessage = message_type('prepare', 'view seqno digest replica_id')
+CommitMessage = message_type('commit', 'view seqno digest replica_id')
+ReplyMessage = message_type('reply', 'view timestamp client replica_id result')
+CheckpointMessage = message_type('checkpoint', 'seqno digest replica_id')
+ViewChangeMessage = message_type(
+    'viewchange', 'nextview checkpoint_seqno checkpoint_messages prepare_messages replica_id')
+NewViewMessage = message_type('newview', 'newview viewchange_messages preprepare_messages')
 
 class Message:
     # Jiali: Copied from Ethereum
@@ -9,6 +21,8 @@ class Message:
         self.origin_node = origin_node
         _env = origin_node.env
         self._message_size = _env.config['pbft']['message_size_kB']
+        # Sizes in MB of the messages with a fixed size
+        self._size = {name: kB_to_MB(size) for name, size in self._message_size.items()}
 
         # Digest is 1 meaning correct/valid, 0 is malicious and modified/invalid message.
         self.digest = 0 if self.origin_node.is_malicious == MaliciousModel.ACTIVE else 1
@@ -17,15 +31,13 @@ class Message:
         """ Inform a peer of its current PoA state.
         This message should be sent `after` the initial handshake and `prior` to any PoA related messages.
         """
-        return {
-            'id': 'status',
-            'protocol_version': 'ONE',
-            'network': self.origin_node.network.name,
-            'td': self.origin_node.chain.head.header.difficulty,
-            'best_hash': self.origin_node.chain.head.header.hash,
-            'genesis_hash': self.origin_node.chain.genesis.header.hash,
-            'size': kB_to_MB(self._message_size['status'])
-        }
+        return StatusMessage(
+            protocol_version='ONE',
+            network=self.origin_node.network.name,
+            td=self.origin_node.chain.head.header.difficulty,
+            best_hash=self.origin_node.chain.head.header.hash,
+            genesis_hash=self.origin_node.chain.genesis.header.hash,
+            size=self._size['status'])
 
     def transactions(self, transactions: list):
         """ Specify (a) transaction(s) that the peer should make sure is included on its
@@ -34,11 +46,9 @@ class Message:
         """
         num_txs = len(transactions)
         transactions_size = num_txs * self._message_size['tx']
-        return {
-            'id': 'transactions',
-            'transactions': transactions,
-            'size': kB_to_MB(transactions_size)
-        }
+        return TransactionsMessage(
+            transactions=transactions,
+            size=kB_to_MB(transactions_size))
     
     # Ryan: Reformat messages to hold info
     def pre_prepare(self, seqno, new_blocks: dict, block_bodies: dict, new_view):
@@ -49,99 +59,81 @@ class Message:
 
         if new_view:
             
-            return {
-                'id': 'pre-prepare',
-                'view': self.origin_node.network.view + 1,
-                'seqno': seqno,
-                'digest': self.digest,
-                'new_blocks': new_blocks,
-                'block_bodies': block_bodies,
-                'size': kB_to_MB(self._message_size['tx'])
-                }
+            return PrePrepareMessage(
+                view=self.origin_node.network.view + 1,
+                seqno=seqno,
+                digest=self.digest,
+                new_blocks=new_blocks,
+                block_bodies=block_bodies,
+                size=self._size['tx'])
         else:
             
             num_new_block_hashes = len(new_blocks)
             new_blocks_size = num_new_block_hashes * \
                           self._message_size['hash_size']
 
-            txsCount = 0
-            for block_hash, block_txs in block_bodies.items():
-                txsCount += len(block_txs)
-            message_size = (txsCount * self._message_size['tx']) + self._message_size['block_bodies']
-            return {
-                'id': 'pre-prepare',
-                'view': self.origin_node.network.view,
-                'seqno': seqno,
-                'digest': self.digest,
-                'new_blocks': new_blocks,
-                'block_bodies': block_bodies,
-                'size': kB_to_MB(message_size+new_blocks_size)
-                }
+            # The block bodies are the blocks, with their size computed when they were built
+            message_size = sum(block.size for block in block_bodies.values())
+            return PrePrepareMessage(
+                view=self.origin_node.network.view,
+                seqno=seqno,
+                digest=self.digest,
+                new_blocks=new_blocks,
+                block_bodies=block_bodies,
+                size=message_size + kB_to_MB(new_blocks_size))
     
     def prepare(self, seqno):
 
-        return {
-            'id': 'prepare',
-            'view': self.origin_node.network.view,
-            'seqno': seqno,
-            'digest': self.digest,
-            'replica_id': self.origin_node.replica_id,
-            'size': kB_to_MB(self._message_size['prepare'])
-        }
+        return PrepareMessage(
+            view=self.origin_node.network.view,
+            seqno=seqno,
+            digest=self.digest,
+            replica_id=self.origin_node.replica_id,
+            size=self._size['prepare'])
     
     # Originally copied from "block_bodies()" in the ETH version of message.py
     def commit(self, seqno):
 
-        return {
-            'id': 'commit',
-            'view': self.origin_node.network.view,
-            'seqno': seqno,
-            'digest': self.digest,
-            'replica_id': self.origin_node.replica_id,
-            'size': kB_to_MB(self._message_size['commit'])
-        }
+        return CommitMessage(
+            view=self.origin_node.network.view,
+            seqno=seqno,
+            digest=self.digest,
+            replica_id=self.origin_node.replica_id,
+            size=self._size['commit'])
     
     def client_reply(self, new_block):
-        return {
-            'id': 'reply',
-            'view': self.origin_node.network.view,
-            'timestamp': new_block.header.timestamp,  
-            'client': self.origin_node.network.view % len(self.origin_node.network._list_authority_nodes), 
-            'replica_id': self.origin_node.replica_id,  
-            'result': new_block,
-            'size': kB_to_MB(self._message_size['reply']) #TODO: Will need to add block size
-        }
+        return ReplyMessage(
+            view=self.origin_node.network.view,
+            timestamp=new_block.header.timestamp,
+            client=self.origin_node.network.view % len(self.origin_node.network._list_authority_nodes),
+            replica_id=self.origin_node.replica_id,
+            result=new_block,
+            size=self._size['reply'])  # TODO: Will need to add block size
 
     def checkpoint(self, seqno, replica_id):
 
-        return {
-            'id': 'checkpoint',
-            'seqno': seqno,
-            'digest': self.digest,
-            'replica_id': replica_id,
-            'size': kB_to_MB(self._message_size['checkpoint'])
-        }
+        return CheckpointMessage(
+            seqno=seqno,
+            digest=self.digest,
+            replica_id=replica_id,
+            size=self._size['checkpoint'])
     
     def view_change(self, ckpt_seqno, checkpoint_msg, prepare_msg):
-        return {
-           'id': "viewchange",
-           'nextview': self.origin_node.network.view + 1,
-           'checkpoint_seqno': ckpt_seqno,
-           'checkpoint_messages': checkpoint_msg,
-           'prepare_messages': prepare_msg,
-           'replica_id': self.origin_node.replica_id,
-           'size': kB_to_MB(self._message_size['viewchange_base']) + (len(checkpoint_msg) * kB_to_MB(self._message_size['checkpoint'])) + \
-            (len(prepare_msg) * kB_to_MB(self._message_size['prepare']))
-            }
+        return ViewChangeMessage(
+            nextview=self.origin_node.network.view + 1,
+            checkpoint_seqno=ckpt_seqno,
+            checkpoint_messages=checkpoint_msg,
+            prepare_messages=prepare_msg,
+            replica_id=self.origin_node.replica_id,
+            size=self._size['viewchange_base'] + (len(checkpoint_msg) * self._size['checkpoint']) +
+            (len(prepare_msg) * self._size['prepare']))
     
     def new_view(self, viewchange_msg, preprepare_msg):
         # Jiali: the following line is redundant as per line 425 in node.py: self.network.view += 1
         # self.origin_node.network.view = self.origin_node.network.view + 1
-        return {
-            'id': "newview",
-            'newview': self.origin_node.network.view + 1,
-            'viewchange_messages': viewchange_msg,
-            'preprepare_messages': preprepare_msg,
-            'size': kB_to_MB(self._message_size['newview_base']) + (len(viewchange_msg) * kB_to_MB(self._message_size['viewchange_base'])) + \
-            (len(preprepare_msg) * kB_to_MB(self._message_size['tx']))
-            }
\ No newline at end of file
+        return NewViewMessage(
+            newview=self.origin_node.network.view + 1,
+            viewchange_messages=viewchange_msg,
+            preprepare_messages=preprepare_msg,
+            size=self._size['newview_base'] + (len(viewchange_msg) * self._size['viewchange_base']) +
+            (len(preprepare_msg) * self._size['tx']))
\ No newline at end of file
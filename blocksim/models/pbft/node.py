@@ -1,22 +1,39 @@
 from collections import namedtuple  # to support envelope finality for viewchanges
 from blocksim.models.permissioned_node import PermNode as Node
 from blocksim.models.pbft_network import PBFTNetwork as Network, MaliciousModel
+from blocksim.models.permissioned_network import PeerGroup
 from blocksim.models.chain import Chain
 from blocksim.models.consensus import Consensus
 from blocksim.models.db import BaseDB
-from blocksim.models.permissoned_transaction_queue import TransactionQueue
-from blocksim.utils import time, get_random_values
+from blocksim.models.permissoned_transaction_queue import TransactionQueue, TransactionRowQueue
+from blocksim.utils import time, get_random_values, kB_to_MB, skip_sequential_ids
 from blocksim.models.block import Block, BlockHeader
 from blocksim.models.pbft.message import Message
+from blocksim.models import message
 from collections import defaultdict
 from pathlib import Path
-from scipy import random
 import pickle
 
 Envelope = namedtuple('Envelope', 'msg, timestamp, destination, origin')
 
 
 class PBFTNode(Node):
+    HANDLERS = {
+        message.STATUS: '_receive_status',
+        message.TRANSACTIONS: '_receive_full_transactions',
+        message.REPLY: '_receive_reply',
+        message.PRE_PREPARE: '_receive_pre_prepare',
+        message.PREPARE: '_receive_prepare',
+        message.COMMIT: '_receive_commit',
+        message.CHECKPOINT: '_receive_checkpoint_message',
+        # Only the prospective next view primary should care about a viewchange
+        # This is checked within "receive_viewchange"
+        message.VIEWCHANGE: '_receive_viewchange',
+        message.NEWVIEW: '_receive_newview'
+    }
+    # Only do these if you are authority
+    AUTHORITY_HANDLERS = frozenset((message.PRE_PREPARE, message.PREPARE, message.COMMIT,
+                                    message.CHECKPOINT, message.VIEWCHANGE, message.NEWVIEW))
 
     def __init__(self,
                  env,
@@ -47,8 +64,9 @@ class PBFTNode(Node):
         if is_authority:
             self.current_view = self.network.view
             self.current_sequence = 0
-            # Transaction Queue to store the transactions
-            self.transaction_queue = TransactionQueue(
+            # Transaction Queue to store the transactions (their rows when using the transaction table)
+            queue = TransactionQueue if env.transactions is None else TransactionRowQueue
+            self.transaction_queue = queue(
                 env, self, self.consensus)
             self.env.process(self._check_timeout())  # When node is initialized, begin periodically checking for timeout
             self.env.process(
@@ -92,7 +110,7 @@ class PBFTNode(Node):
 
         # Jiali: Assume passive malicious nodes doesn't broadcast blocks either.
         if self.is_malicious == MaliciousModel.PASSIVE:
-            drop_message = random.choice([True, False], p=[self.drop_probability, 1 - self.drop_probability])
+            drop_message = self.rng.choice([True, False], p=[self.drop_probability, 1 - self.drop_probability])
             if drop_message:
                 return True
 
@@ -100,20 +118,17 @@ class PBFTNode(Node):
         transactions_per_block_dist = self.env.config[
             'pbft']['number_transactions_per_block']
         transactions_per_block = int(
-            get_random_values(transactions_per_block_dist)[0])
-        pending_txs = []
+            get_random_values(transactions_per_block_dist, random_state=self.rng)[0])
+        max_txs = transactions_per_block * block_size
+        pending_txs = self.transaction_queue.get_many(max_txs)
         tx_left = True
-        for i in range(transactions_per_block * block_size):
-            if self.transaction_queue.is_empty():
-                if self.verbose:
-                    print(
-                        f'{self.address} at {time(self.env)}: No more transactions queued.')
-                # Jiali: stop simulation when tx are done, in order to know whether/when it happens
-                # raise Exception('TX all processed')
-                tx_left = False if i == 0 else True
-                break
-            pending_tx = self.transaction_queue.get()
-            pending_txs.append(pending_tx)
+        if len(pending_txs) < max_txs:
+            if self.verbose:
+                print(
+                    f'{self.address} at {time(self.env)}: No more transactions queued.')
+            # Jiali: stop simulation when tx are done, in order to know whether/when it happens
+            # raise Exception('TX all processed')
+            tx_left = len(pending_txs) > 0
         candidate_block = self._build_candidate_block(pending_txs)
         if self.verbose:
             print(
@@ -139,42 +154,23 @@ class PBFTNode(Node):
             timestamp,
             coinbase,
             difficulty)
-        return Block(candidate_block_header, pending_txs)
+        message_size = self.env.config['pbft']['message_size_kB']
+        block_size = kB_to_MB(len(pending_txs) * message_size['tx'] + message_size['block_bodies'])
+        return Block(candidate_block_header, pending_txs, block_size)
 
     def _read_envelope(self, envelope):
         # Jiali: This function is borrowed from ethereum/node.py, with minor changes.
         super()._read_envelope(envelope)
 
         if self.is_malicious == MaliciousModel.PASSIVE:
-            drop_message = random.choice([True, False], p=[self.drop_probability, 1 - self.drop_probability])
+            drop_message = self.rng.choice([True, False], p=[self.drop_probability, 1 - self.drop_probability])
             if drop_message:
                 return
                 # to relax the assumption of malicious nodes handling newview
                 # if envelope.msg['id'] not in ('checkpoint', 'viewchange', 'newview'):
                 #     return
 
-        if envelope.msg['id'] == 'status':
-            self._receive_status(envelope)
-        if envelope.msg['id'] == 'transactions':
-            self._receive_full_transactions(envelope)
-        if envelope.msg['id'] == 'reply':
-            self._receive_reply(envelope)
-        # Only do these if you are authority
-        if self.is_authority:
-            if envelope.msg['id'] == 'pre-prepare':
-                self._receive_pre_prepare(envelope)
-            if envelope.msg['id'] == 'prepare':
-                self._receive_prepare(envelope)
-            if envelope.msg['id'] == 'commit':
-                self._receive_commit(envelope)
-            if envelope.msg['id'] == 'checkpoint':
-                self._receive_checkpoint_message(envelope)
-            # Only the prospective next view primary should care about a viewchange
-            # This is checked within "receive_viewchange"
-            if envelope.msg['id'] == 'viewchange':
-                self._receive_viewchange(envelope)
-            if envelope.msg['id'] == 'newview':
-                self._receive_newview(envelope)
+        self._dispatch(envelope)
 
     ##              ##
     ## Handshake    ##
@@ -182,8 +178,10 @@ class PBFTNode(Node):
 
     def connect(self, nodes: list):
         super().connect(nodes)
-        for node in nodes:
-            self._handshake(node.address)
+        # With lazy connections, the handshake is sent when the session is opened
+        if not self.lazy_connections:
+            for node in nodes:
+                self._handshake(node.address)
 
     def _handshake(self, destination_address: str):
         """Handshake inform a node of its current ethereum state, negotiating network, difficulties,
@@ -199,9 +197,8 @@ class PBFTNode(Node):
         if self.verbose:
             print(
                 f'{self.address} at {time(self.env)}: Receive status from {envelope.origin.address}')
-        node = self.active_sessions.get(envelope.origin.address)
+        node = self._session(envelope.origin.address)
         node['status'] = envelope.msg
-        self.active_sessions[envelope.origin.address] = node
         self._handshaking.succeed()
         self._handshaking = self.env.event()
 
@@ -214,16 +211,26 @@ class PBFTNode(Node):
         as known by each node"""
         yield self.connecting  # Wait for all connections
         # yield self._handshaking  # Wait for handshaking to be completed
-        for node_address, node in self.active_sessions.items():
-            for tx in transactions:
-                # Checks if the transaction was previous sent
-                if any({tx.hash} & node.get('knownTxs')):
+        if isinstance(transactions, range):
+            # Rows of the transaction table, the whole batch is marked as known
+            for node_address, node in self._sessions():
+                if transactions in node.get('knownTxs'):
                     if self.verbose:
                         print(
-                            f'{self.address} at {time(self.env)}: Transaction {tx.hash[:8]} was already sent to {node_address}')
-                    transactions.remove(tx)
-                else:
-                    self._mark_transaction(tx.hash, node_address)
+                            f'{self.address} at {time(self.env)}: Transactions {transactions} were already sent to {node_address}')
+                    return
+                self._mark_transaction(transactions, node_address)
+        else:
+            for node_address, node in self._sessions():
+                for tx in transactions:
+                    # Checks if the transaction was previous sent
+                    if any({tx.hash} & node.get('knownTxs')):
+                        if self.verbose:
+                            print(
+                                f'{self.address} at {time(self.env)}: Transaction {tx.hash[:8]} was already sent to {node_address}')
+                        transactions.remove(tx)
+                    else:
+                        self._mark_transaction(tx.hash, node_address)
         # Only send if it has transactions
         if transactions:
             if self.verbose:
@@ -235,6 +242,10 @@ class PBFTNode(Node):
     def _receive_full_transactions(self, envelope):
         """Handle full tx received. If node is authority store transactions in a pool (ordered by the gas price)"""
         transactions = envelope.msg.get('transactions')
+        if isinstance(transactions, range):
+            if self.is_authority:
+                self.transaction_queue.put(transactions)
+            return
         valid_transactions = []
         for tx in transactions:
             if self.is_authority:
@@ -259,7 +270,8 @@ class PBFTNode(Node):
         for block in new_blocks:
             # Jiali: I changed the header number to header itself, for the sake of flexibility.
             new_blocks_hashes[block.header.hash] = block.header
-            block_bodies[block.header.hash] = block.transactions
+            # The block itself is the body, all the receivers share it
+            block_bodies[block.header.hash] = block
             # Jiali: Add block to its own log first.
             seqno = block.header.number
             self.log['block'][seqno] = block
@@ -287,7 +299,7 @@ class PBFTNode(Node):
         for block_hash, block_header in new_blocks.items():
             self._send_prepare(envelope)
             # Jiali: store the block in the log for future commit
-            block = Block(block_header, block_bodies[block_hash])
+            block = block_bodies[block_hash]
             self.log['block'][seqno] = block
             if self.verbose:
                 print('TIME IS ' + time(self.env))
@@ -309,7 +321,7 @@ class PBFTNode(Node):
                 f'{self.address} at {time(self.env)}: Prepare prepared to multicast.')
         prepare_msg = self.network_message.prepare(seqno)
         self.log['prepare'][seqno].add(self.address)
-        self.env.process(self.broadcast_to_authorities(prepare_msg))
+        self.multicast_coalesced(prepare_msg, PeerGroup.AUTHORITIES)
 
     def _receive_prepare(self, envelope):
         # yield self.env.timeout(self.network.validation_delay)
@@ -330,7 +342,7 @@ class PBFTNode(Node):
         """
         commit_msg = self.network_message.commit(seqno)
         self.log['commit'][seqno].add(self.address)
-        self.env.process(self.broadcast_to_authorities(commit_msg))
+        self.multicast_coalesced(commit_msg, PeerGroup.AUTHORITIES)
 
     def _receive_commit(self, envelope):
         # yield self.env.timeout(self.network.validation_delay)
@@ -353,7 +365,7 @@ class PBFTNode(Node):
                 new_block = self.log['block'][seqno]
                 # if self._is_primary():
                 client_reply = self.network_message.client_reply(new_block)
-                self.env.process(self.broadcast_to_non_authorities(client_reply))
+                self.env.process(self.multicast(client_reply, PeerGroup.NON_AUTHORITIES))
                 self.chain.add_block(new_block)
                 if self.verbose:
                     print(
@@ -381,14 +393,18 @@ class PBFTNode(Node):
         self.prevView = 0
         self.timeoutCount = 0
         self.prevLogBlockLength = 0
+        self.prevSkippedRounds = 0
 
         while True:
             yield self.env.timeout(self.timeoutVal)
             # TOT: Bugfix. prevLog always same as log
             # assert self.prevLogBlockLength == len(self.log['block'])
             # TODO: Bugfix. Stop timeout and viewchange sending after leader change! Jiali
+            # The rounds skipped by the idle fast-forward of the network are not a failure of the
+            # primary, unless this node lags behind it
             if self.prevView == self.network.view and (self.prevLogBlockLength == len(
-                    self.log['block'])):  # No new blocks have been sent to a node + prevLog nonempty
+                    self.log['block'])) and not (self.network.is_skipping_rounds(self.prevSkippedRounds) and
+                                                 self.chain.head.header.number >= self.network.primary.chain.head.header.number):  # No new blocks have been sent to a node + prevLog nonempty
                 self.timedout = True
                 self._send_viewchange()
                 self.timeoutCount += 1
@@ -397,6 +413,7 @@ class PBFTNode(Node):
 
             self.prevView = self.network.view
             self.prevLogBlockLength = len(self.log['block'])  # track log every timeout check
+            self.prevSkippedRounds = self.network.skipped_rounds
 
     def _checkpointing(self):
         while True:
@@ -407,7 +424,7 @@ class PBFTNode(Node):
 
     def _send_checkpoint_message(self, seqno):
         checkpoint_msg = self.network_message.checkpoint(seqno, self.replica_id)
-        self.env.process(self.broadcast_to_authorities(checkpoint_msg))
+        self.multicast_coalesced(checkpoint_msg, PeerGroup.AUTHORITIES)
         self.log['checkpoint'][seqno].add(self.address)
 
     def _receive_checkpoint_message(self, envelope):
@@ -436,7 +453,7 @@ class PBFTNode(Node):
         prepare_msg = self._collect_viewchange_prepareset()
         viewchange_msg = self.network_message.view_change(self.lastCheckpoint, checkpoint_msg, prepare_msg)
         self.log['viewchange'][self.network.view].append((self.address, viewchange_msg))
-        self.env.process(self.broadcast_to_authorities(viewchange_msg))
+        self.env.process(self.multicast(viewchange_msg, PeerGroup.AUTHORITIES))
 
     def _collect_viewchange_prepareset(self):
         prepareset = []
@@ -473,7 +490,7 @@ class PBFTNode(Node):
         preprepare_msg = self._collect_newview_preprepareset(viewchange_msg)
         newview_msg = self.network_message.new_view(viewchange_msg, preprepare_msg)
         self.log['newview'][newView].add(self.address)
-        self.env.process(self.broadcast_to_authorities(newview_msg))
+        self.env.process(self.multicast(newview_msg, PeerGroup.AUTHORITIES))
         self.network.view += self.timeoutCount
 
     def _collect_newview_preprepareset(self, viewchange_msg):
@@ -567,6 +584,7 @@ class PBFTNode(Node):
             # genesis = yesterday_chains.genesis
             # db = yesterday_chains.db
             genesis, db = pickle.load(f)
+            skip_sequential_ids(db.db)
             consensus = Consensus(self.env)
             self.chain = Chain(self.env, self, consensus, genesis, db)
         # Jiali: remove dumped file after restore to collect garbage
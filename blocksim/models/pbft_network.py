@@ -1,8 +1,8 @@
+import math
 import simpy
 from datetime import datetime
 from simpy import Store
 from blocksim.utils import get_random_values, time, get_latency_delay
-from random import random
 from enum import Enum
 from blocksim.models.permissioned_network import PermissionedNetwork
 
@@ -25,6 +25,11 @@ class PBFTNetwork(PermissionedNetwork):
         self.checkpoint_delay = 10
         self.validation_delay = 0.1
 
+    @property
+    def primary(self):
+        """The authority that builds the blocks in the current view"""
+        return self._list_authority_nodes[self.view % len(self._list_authority_nodes)]
+
     def start_pbft_heartbeat(self):
         self._init_lists()
         empty_block = 0
@@ -34,13 +39,20 @@ class PBFTNetwork(PermissionedNetwork):
         self.f = int(len(self._list_authority_nodes)/3)
         
         while True:
-            time_between_blocks = round(get_random_values(
-                self.env.delays['time_between_blocks_seconds'])[0], 2)
+            time_between_blocks = round(self.env.delays['time_between_blocks_seconds'].sample(), 2)
             yield self.env.timeout(time_between_blocks)
 
             # Ryan: Implement new block selection process here (updated for PBFT 7/3!)
             # Bugfix: IndexError: list index out of range, bugfix done
             selected_node = self._list_authority_nodes[self.view % len(self._list_authority_nodes)]
+            idle_delay = self._idle_delay(selected_node)
+            if idle_delay is not None:
+                # Nothing to put in the block, skip the round
+                if idle_delay == math.inf:
+                    break
+                if idle_delay:
+                    yield self.env.timeout(idle_delay)
+                continue
             if self.verbose:
                 print(f'If the signer is in-turn, wait for the exact time to arrive, sign and broadcast immediately, at {time(self.env)}.')
 
@@ -61,12 +73,20 @@ class PBFTNetwork(PermissionedNetwork):
         empty_block = 0
 
         while True:
-            time_between_blocks = round(get_random_values(
-                self.env.delays['time_between_blocks_seconds'])[0], 2)
+            time_between_blocks = round(self.env.delays['time_between_blocks_seconds'].sample(), 2)
             yield self.env.timeout(time_between_blocks)
 
             # Ryan: Implement new block selection process here
             selected_node = self._list_authority_nodes[self.view % len(self._list_authority_nodes)]
+            idle_delay = self._idle_delay(selected_node)
+            if idle_delay is not None:
+                # Nothing to put in the block, skip the round
+                self.view = self.view + 1
+                if idle_delay == math.inf:
+                    break
+                if idle_delay:
+                    yield self.env.timeout(idle_delay)
+                continue
             if self.verbose:
                 print('If the signer is in-turn, wait for the exact time to arrive, ' +
                   'sign and broadcast immediately, at %d' % self.env.now)
@@ -1,4 +1,18 @@
+import math
+from enum import Enum
 from blocksim.models.network import Network, Connection
+from blocksim.termination import CommittedTransactions
+
+# Simulated seconds after which a node whose chain stopped growing behind the others is considered
+# stalled, so it does not prevent the idle fast-forward (see `_idle_delay`)
+STALLED_SECONDS = 30
+
+
+class PeerGroup(Enum):
+    """Groups of the peers of a node that a message can be multicast to"""
+    ALL = 0
+    AUTHORITIES = 1
+    NON_AUTHORITIES = 2
 
 
 class PermissionedNetwork(Network):
@@ -6,6 +20,19 @@ class PermissionedNetwork(Network):
         super().__init__(env, name)
         self._list_authority_nodes = []  # Want to keep track of which nodes are authorities
         self.authority_index = 0  # Keep track of which authority we're on
+        # Peers of each node in each group, see `peer_group`
+        self._peer_groups = {}
+        # Skip the rounds that would build empty blocks, see `_idle_delay`
+        self.idle_fast_forward = self.env.config.get('idle_fast_forward', False)
+        # Factory of the transactions, whose schedule tells how long the network stays idle
+        self.transaction_factory = None
+        # Rounds skipped so far, and the time until which the heartbeat sleeps after the last one
+        self.skipped_rounds = 0
+        self.idle_until = 0
+        # Height of the chain of each node, and the time when it last grew, by address
+        self._heights = {}
+        # Transactions in the chain of each authority since the first round, by address
+        self._committed = {}
 
     def add_node(self, node):
         self._nodes[node.address] = node
@@ -15,3 +42,82 @@ class PermissionedNetwork(Network):
             self._list_nodes.append(node)
             if node.is_authority:  # Put the authority nodes in the authority node list
                 self._list_authority_nodes.append(node)
+        for node in self._nodes.values():
+            self._init_peer_groups(node)
+
+    def _init_peer_groups(self, node):
+        """Splits the peers of `node` in groups, once, in the order they were connected"""
+        peers = tuple(node.peers.values())
+        groups = self._peer_groups[node.address] = {
+            PeerGroup.ALL: peers,
+            PeerGroup.AUTHORITIES: tuple(peer for peer in peers if peer.is_authority),
+            PeerGroup.NON_AUTHORITIES: tuple(peer for peer in peers if not peer.is_authority)
+        }
+        return groups
+
+    def peer_group(self, node, group: PeerGroup = PeerGroup.ALL):
+        """Returns the peers of `node` in the `group`. The groups are computed when the lists of
+        the network are initialized, so the nodes must be connected before"""
+        groups = self._peer_groups.get(node.address)
+        if groups is None:
+            groups = self._init_peer_groups(node)
+        return groups[group]
+
+    def _idle_delay(self, node):
+        """With `"idle_fast_forward": true`, tells whether the heartbeat can skip the round where
+        `node` would build an empty block: all the transactions created so far are in the chain of
+        `node`, no message is on its way and the other nodes have the chain of `node`, so the network
+        is idle until the next injection of the `transaction_factory`. Returns `None` when the round
+        must be played, otherwise how long the heartbeat can sleep: `inf` to end the heartbeat once
+        no injection is left and every authority has all the transactions in its chain.
+
+        The idleness is told from the distinct committed transactions rather than from the queues,
+        as the PBFT replicas keep the transactions they queue once they are committed.
+        The skipped rounds and the simulated seconds skipped are recorded in the report."""
+        if not self.idle_fast_forward or self.transaction_factory is None:
+            return None
+        if not self._committed:
+            # Created on the first round, before the first block of the simulation
+            self._committed = {authority.address: CommittedTransactions(authority.chain)
+                               for authority in self._list_authority_nodes}
+        created = self.env.data['created_transactions']
+        if self._committed[node.address].count() < created:
+            return None
+        if not all(peer.is_idle() for peer in self._list_nodes) or not self._caught_up(node):
+            return None
+        next_injection = self.transaction_factory.next_injection()
+        if next_injection is not None:
+            delay = max(next_injection - self.env.now, 0)
+        elif all(committed.count() >= created for committed in self._committed.values()):
+            delay = math.inf
+        else:
+            # Some authority still misses transactions, so the next rounds are checked again
+            delay = 0
+        self.skipped_rounds += 1
+        self.idle_until = self.env.now + delay
+        stats = self.env.data.setdefault('idle_fast_forward', {'skipped_rounds': 0, 'skipped_seconds': 0})
+        stats['skipped_rounds'] += 1
+        if delay != math.inf:
+            stats['skipped_seconds'] += delay
+        return delay
+
+    def is_skipping_rounds(self, since: int):
+        """Whether the heartbeat skipped a round after the `since`-th one, or sleeps until the next
+        injection, so the authorities do not take the lack of new blocks for a failure"""
+        return self.skipped_rounds > since or self.env.now < self.idle_until
+
+    def _caught_up(self, node):
+        """Whether every node has the chain of `node`, leaving out the nodes whose chain did not
+        grow for `STALLED_SECONDS`, which the empty blocks would not help either"""
+        height = node.chain.head.header.number
+        caught_up = True
+        for peer in self._list_nodes:
+            peer_height = peer.chain.head.header.number
+            last_height, grown_at = self._heights.get(peer.address, (None, None))
+            if peer_height != last_height:
+                self._heights[peer.address] = peer_height, self.env.now
+            elif peer_height < height and self.env.now - grown_at >= STALLED_SECONDS:
+                continue
+            if peer_height < height:
+                caught_up = False
+        return caught_up
@@ -1,10 +1,11 @@
 from collections import namedtuple
-from blocksim.models.permissioned_network import Connection, Network
+from blocksim.models.permissioned_network import Connection, Network, PeerGroup
  #Ryan: wasn't importing permissioned network before 7/5
 from blocksim.models.chain import Chain
 from blocksim.models.node import Node
 from blocksim.models.consensus import Consensus
-from blocksim.utils import get_received_delay, get_sent_delay, get_latency_delay, time
+from blocksim.models import message
+from blocksim.utils import get_composite_delay, get_multicast_delays, monitor_key, time
 
 Envelope = namedtuple('Envelope', 'msg, timestamp, destination, origin')
 
@@ -42,49 +43,67 @@ class PermNode(Node):
         
         #Indicate whether the permissioned node is an authority or not
         self.is_authority = is_authority
-
-    def listening_node(self, connection):
+        # Time (in seconds) during which the control messages sent to the same peer are bundled in
+        # a single envelope, see `multicast_coalesced`. Messages are not bundled when it is 0
+        self.coalescing_window = env.config.get('coalescing_window', 0)
+        # Messages waiting for the end of the coalescing window, by peer address
+        self._bundles = {}
+        # Broadcasts of transactions in progress, validating or uploading them
+        self._sending_transactions = 0
+        # Time when the node finishes uploading the last message it sent
+        self._uploaded_until = 0
+
+    def listening_node(self):
         while True:
-            # Get the messages from connection
-            envelope = yield connection.get()
-            origin_loc = envelope.origin.location
-            dest_loc = envelope.destination.location
-            message_size = envelope.msg['size']
-            received_delay = get_received_delay(
-                self.env, message_size, origin_loc, dest_loc)
-            yield self.env.timeout(received_delay)
-
-            # Monitor the transaction propagation on Ethereum
-            if envelope.msg['id'] == 'transactions':
-                tx_propagation = self.env.data['tx_propagation'][
-                    f'{envelope.origin.address}_{envelope.destination.address}']
-                txs = {}
-                for tx in envelope.msg['transactions']:
-                    initial_time = tx_propagation.get(tx.hash[:8], None)
-                    if initial_time is not None:
-                        propagation_time = self.env.now - initial_time
-                        txs.update({f'{tx.hash[:8]}': propagation_time})
-                self.env.data['tx_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
-                    txs)
-            # Monitor the block propagation on Ethereum and PBFT
-            if envelope.msg['id'] in ('block_bodies', 'pre-prepare'):
-                block_propagation = self.env.data['block_propagation'][
-                    f'{envelope.origin.address}_{envelope.destination.address}']
-                blocks = {}
-                for block_hash, _ in envelope.msg['block_bodies'].items():
-                    initial_time = block_propagation.get(block_hash[:8], None)
-                    if initial_time is not None:
-                        propagation_time = self.env.now - initial_time
-                        blocks.update({f'{block_hash[:8]}': propagation_time})
-                self.env.data['block_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
-                    blocks)
-
-            self._read_envelope(envelope)
+            # Get the messages of all the connections
+            # The connections deliver the messages already downloaded (see `Connection.deliver`)
+            envelope = yield self.inbox.get()
+
+            self._monitor_received(envelope)
+            if envelope.msg.opcode == message.BUNDLE:
+                for msg in envelope.msg.messages:
+                    self._read_envelope(envelope._replace(msg=msg))
+            else:
+                self._read_envelope(envelope)
+
+    def _monitor_received(self, envelope):
+        """Records the propagation time of the transactions and blocks received in `envelope`"""
+        # Monitor the transaction propagation on Ethereum
+        if envelope.msg['id'] == 'transactions':
+            tx_propagation = self.env.data['tx_propagation'][
+                f'{envelope.origin.address}_{envelope.destination.address}']
+            txs = {}
+            for tx_key in self._transaction_keys(envelope.msg['transactions']):
+                initial_time = tx_propagation.get(tx_key, None)
+                if initial_time is not None:
+                    propagation_time = self.env.now - initial_time
+                    txs.update({tx_key: propagation_time})
+            self.env.data['tx_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
+                txs)
+        # Monitor the block propagation on Ethereum and PBFT
+        if envelope.msg['id'] in ('block_bodies', 'pre-prepare'):
+            block_propagation = self.env.data['block_propagation'][
+                f'{envelope.origin.address}_{envelope.destination.address}']
+            blocks = {}
+            for block_hash, _ in envelope.msg['block_bodies'].items():
+                initial_time = block_propagation.get(monitor_key(block_hash), None)
+                if initial_time is not None:
+                    propagation_time = self.env.now - initial_time
+                    blocks.update({monitor_key(block_hash): propagation_time})
+            self.env.data['block_propagation'][f'{envelope.origin.address}_{envelope.destination.address}'].update(
+                blocks)
+
+    def _transaction_keys(self, transactions):
+        """Returns the keys of `transactions` in the propagation monitor, they can be `Transaction`
+        objects or the rows of the transaction table"""
+        if isinstance(transactions, list):
+            return [monitor_key(tx.hash) for tx in transactions]
+        return self.env.transactions.keys(transactions)
 
     def send(self, destination_address: str, msg):
         if self.address == destination_address:
             return
-        node = self.active_sessions[destination_address]
+        node = self._session(destination_address)
         active_connection = node['connection']
         origin_node = active_connection.origin_node
         destination_node = active_connection.destination_node
@@ -110,12 +129,12 @@ class PermNode(Node):
             delay = self.consensus.validate_transaction()
             yield self.env.timeout(delay)
 
-        upload_transmission_delay = get_sent_delay(
+        upload_transmission_delay, latency_delay, received_delay = get_composite_delay(
             self.env, msg['size'], origin_node.location, destination_node.location)
         yield self.env.timeout(upload_transmission_delay)
 
         envelope = Envelope(msg, time(self.env), destination_node, origin_node)
-        active_connection.put(envelope)
+        active_connection.deliver(envelope, latency_delay, received_delay)
 
     def broadcast(self, msg):
         # Perform block validation before sending
@@ -131,6 +150,7 @@ class PermNode(Node):
         # Perform transaction validation before sending
         # For Ethereum:
         if msg['id'] == 'transactions':
+            self._sending_transactions += 1
             for tx in msg['transactions']:
                 delay = self.consensus.validate_transaction()
                 yield self.env.timeout(delay)
@@ -140,95 +160,83 @@ class PermNode(Node):
             yield self.env.timeout(delay)
 
         """Broadcast a message to all nodes with an active session"""
-        for add, node in self.active_sessions.items():
-            connection = node['connection']
+        yield from self.multicast(msg, PeerGroup.ALL)
+        if msg['id'] == 'transactions':
+            self._sending_transactions -= 1
+
+    def is_idle(self):
+        """Whether no message is on its way to the node, and the node is neither sending
+        transactions nor holding messages to bundle"""
+        return not (self.in_flight or self.inbox.items or self._sending_transactions or self._bundles)
+
+    def multicast(self, msg, group: PeerGroup):
+        """Sends a message to the peers of the `group` (e.g. `PeerGroup.AUTHORITIES`) with an
+        active session, with the peers grouped by the network"""
+        yield from self._multicast(msg, self.network.peer_group(self, group))
+
+    def multicast_coalesced(self, msg, group: PeerGroup):
+        """Multicasts a small control message (e.g. a prepare or a commit) to the peers of the
+        `group`. With a coalescing window, the messages sent to the same peer during the window are
+        bundled in a single envelope, with the sum of their sizes, which is sent at its end."""
+        if not self.coalescing_window:
+            self.env.process(self.multicast(msg, group))
+            return
+        for peer in self.network.peer_group(self, group):
+            bundle = self._bundles.get(peer.address)
+            if bundle is None:
+                bundle = self._bundles[peer.address] = []
+                self.env.timeout(self.coalescing_window, peer).callbacks.append(self._send_bundle)
+            bundle.append(msg)
+
+    def _send_bundle(self, event):
+        peer = event.value
+        messages = self._bundles.pop(peer.address)
+        msg = messages[0] if len(messages) == 1 else message.bundle(messages)
+        connection = self._session(peer.address)['connection']
+        for bundled_msg in messages:
+            self._monitor_sent(bundled_msg, peer)
+        upload_transmission_delay, latency_delay, received_delay = get_composite_delay(
+            self.env, msg['size'], self.location, peer.location)
+        # The bundle is uploaded after the messages the node is already uploading, and the wait
+        # for its upload is part of its delivery
+        self._uploaded_until = max(self.env.now, self._uploaded_until) + upload_transmission_delay
+        envelope = Envelope(msg, time(self.env), peer, self)
+        connection.deliver(envelope, self._uploaded_until - self.env.now + latency_delay, received_delay)
+
+    def _multicast(self, msg, peers):
+        """Sends a message to each of the `peers`, one after the other and after the other uploads
+        of the node, with the delays of all the peers drawn at once"""
+        tx_keys = self._transaction_keys(msg['transactions']) if msg['id'] == 'transactions' else None
+        delays = get_multicast_delays(self.env, msg['size'], self.location, [peer.location for peer in peers])
+        for peer, (upload_transmission_delay, latency_delay, received_delay) in zip(peers, delays):
+            connection = self._session(peer.address)['connection']
             origin_node = connection.origin_node
             destination_node = connection.destination_node
 
-            # Monitor the transaction propagation on Ethereum
-            if msg['id'] == 'transactions':
-                txs = {}
-                for tx in msg['transactions']:
-                    txs.update({f'{tx.hash[:8]}': self.env.now})
-                self.env.data['tx_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    txs)
-            # Monitor the block propagation on Ethereum
-            if msg['id'] in ('new_blocks', 'pre-prepare'):
-                blocks = {}
-                for block_hash in msg['new_blocks']:
-                    blocks.update({f'{block_hash[:8]}': self.env.now})
-                self.env.data['block_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    blocks)
-
-            upload_transmission_delay = get_sent_delay(
-                self.env, msg['size'], origin_node.location, destination_node.location)
-            yield self.env.timeout(upload_transmission_delay)
+            self._monitor_sent(msg, destination_node, tx_keys)
+
+            # The upload starts once the node finished uploading the messages it already sent
+            self._uploaded_until = max(self.env.now, self._uploaded_until) + upload_transmission_delay
+            yield self.env.timeout(self._uploaded_until - self.env.now)
             envelope = Envelope(msg, time(self.env),
                                 destination_node, origin_node)
-            connection.put(envelope)
-            
-    def broadcast_to_authorities(self, msg):
-        """Broadcast a message to all nodes with an active session"""
-        for add, node in self.active_sessions.items():
-            
-            #Want to test if the node is an authority
-            authority_addresses = []
-            for auth_node in self.network._list_authority_nodes:
-                authority_addresses.append(auth_node.address)
-                
-            if add in authority_addresses:
-            
-                connection = node['connection']
-                origin_node = connection.origin_node
-                destination_node = connection.destination_node
-
-                # Monitor the transaction propagation on Ethereum
-                if msg['id'] == 'transactions':
-                    txs = {}
-                    for tx in msg['transactions']:
-                        txs.update({f'{tx.hash[:8]}': self.env.now})
-                    self.env.data['tx_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    txs)
-                    
-                # Monitor the block propagation on Ethereum
-                if msg['id'] == 'new_blocks' or msg['id'] == 'pre-prepare':
-                    blocks = {}
-                    for block_hash in msg['new_blocks']:
-                        blocks.update({f'{block_hash[:8]}': self.env.now})
-                    self.env.data['block_propagation'][f'{origin_node.address}_{destination_node.address}'].update(
-                    blocks)
-
-                upload_transmission_delay = get_sent_delay(
-                    self.env, msg['size'], origin_node.location, destination_node.location)
-                yield self.env.timeout(upload_transmission_delay)
-                envelope = Envelope(msg, time(self.env),
-                                destination_node, origin_node)
-                connection.put(envelope)
-                
-    def broadcast_to_non_authorities(self, msg):
-        """Broadcast a message to all nodes with an active session"""
-        for add, node in self.active_sessions.items():
-            
-            #Want to test if the node is an authority
-            authority_addresses = []
-            for auth_node in self.network._list_authority_nodes:
-                authority_addresses.append(auth_node.address)
-                
-            if add not in authority_addresses:
-            
-                connection = node['connection']
-                origin_node = connection.origin_node
-                destination_node = connection.destination_node
-
-                # Monitor the transaction propagation on PBFT network
-                if msg['id'] == 'reply' and self.verbose:
-                    print("Reply being sent to " + add)
-
-                upload_transmission_delay = get_sent_delay(
-                    self.env, msg['size'], origin_node.location, destination_node.location)
-                yield self.env.timeout(upload_transmission_delay)
-                envelope = Envelope(msg, time(self.env),
-                                destination_node, origin_node)
-                connection.put(envelope)
-            
+            connection.deliver(envelope, latency_delay, received_delay)
 
+    def _monitor_sent(self, msg, destination_node, tx_keys=None):
+        """Records the time when the transactions (with keys `tx_keys`) and blocks in `msg` are sent
+        to `destination_node`"""
+        # Monitor the transaction propagation on Ethereum
+        if msg['id'] == 'transactions':
+            txs = dict.fromkeys(tx_keys, self.env.now)
+            self.env.data['tx_propagation'][f'{self.address}_{destination_node.address}'].update(
+                txs)
+        # Monitor the block propagation on Ethereum
+        if msg['id'] in ('new_blocks', 'pre-prepare'):
+            blocks = {}
+            for block_hash in msg['new_blocks']:
+                blocks.update({monitor_key(block_hash): self.env.now})
+            self.env.data['block_propagation'][f'{self.address}_{destination_node.address}'].update(
+                blocks)
+        # Monitor the transaction propagation on PBFT network
+        if msg['id'] == 'reply' and self.verbose:
+            print("Reply being sent to " + destination_node.address)
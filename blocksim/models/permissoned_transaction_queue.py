@@ -1,4 +1,5 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
+import numpy as np
 # from collections import deque
 # from blocksim.utils import time
 
@@ -22,12 +23,19 @@ class TransactionQueue():
         # Jiali: FIFO popitem is achieved with the OrderedDict() here
         return self._transaction_queue.popitem(last=False)[1]
 
+    def get_many(self, n):
+        """Gets up to `n` transactions in FIFO order"""
+        return [self._transaction_queue.popitem(last=False)[1]
+                for _ in range(min(n, len(self._transaction_queue)))]
+
     def remove(self, tx):
         # None is the default value for pop, so no exception is raised if given key doesn't exist
         return self._transaction_queue.pop(tx.signature, None)
 
     def remove_txs(self, txs):
-        [self._transaction_queue.pop(tx.signature) for tx in txs]
+        # On a sparse topology a block can hold transactions that never reached this node
+        for tx in txs:
+            self._transaction_queue.pop(tx.signature, None)
 
     def add_txs(self, txs):
         for tx in txs:
@@ -38,3 +46,52 @@ class TransactionQueue():
 
     def size(self):
         return len(self._transaction_queue)
+
+
+class TransactionRowQueue():
+    """A FIFO queue of rows of the `TransactionTable`, stored as the `range` of rows of each
+    batch received, so queuing a batch does not depend on its number of transactions"""
+
+    def __init__(self, env, node, consensus):
+        self._env = env
+        self._node = node
+        self._consensus = consensus
+        self._batches = deque()
+        self._size = 0
+        key = f'{node.address}_number_of_transactions_queue'
+        self._env.data[key] = 0
+
+    def put(self, rows: range):
+        key = f'{self._node.address}_number_of_transactions_queue'
+        self._env.data[key] += len(rows)
+        if rows:
+            self._batches.append(rows)
+            self._size += len(rows)
+
+    def get_many(self, n):
+        """Gets the rows of up to `n` transactions in FIFO order, as a `range` when they are
+        contiguous and as an array of row indices otherwise"""
+        taken = []
+        while n > 0 and self._batches:
+            rows = self._batches.popleft()
+            if len(rows) > n:
+                self._batches.appendleft(rows[n:])
+                rows = rows[:n]
+            if taken and taken[-1].stop == rows.start:
+                # Batches next to each other in the table are joined, so the rows stay a `range`
+                taken[-1] = range(taken[-1].start, rows.stop)
+            else:
+                taken.append(rows)
+            n -= len(rows)
+            self._size -= len(rows)
+        if len(taken) == 1:
+            return taken[0]
+        if not taken:
+            return range(0)
+        return np.concatenate([np.arange(rows.start, rows.stop) for rows in taken])
+
+    def is_empty(self):
+        return self._size == 0
+
+    def size(self):
+        return self._size
@@ -1,3 +1,4 @@
+import math
 from datetime import datetime
 from blocksim.utils import get_random_values, time, get_latency_delay
 from blocksim.models.permissioned_network import PermissionedNetwork
@@ -11,11 +12,19 @@ class PoANetwork(PermissionedNetwork):
         self._init_lists()
         empty_block = 0
         while True:
-            time_between_blocks = round(get_random_values(
-                self.env.delays['time_between_blocks_seconds'])[0], 2)
+            time_between_blocks = round(self.env.delays['time_between_blocks_seconds'].sample(), 2)
             yield self.env.timeout(time_between_blocks)
             # Ryan: Implement new block selection process here
             selected_node = self._list_authority_nodes[self.authority_index % len(self._list_authority_nodes)]
+            idle_delay = self._idle_delay(selected_node)
+            if idle_delay is not None:
+                # Nothing to put in the block, skip the round
+                self.authority_index = self.authority_index + 1
+                if idle_delay == math.inf:
+                    break
+                if idle_delay:
+                    yield self.env.timeout(idle_delay)
+                continue
             if self.verbose:
                 print('If the signer is in-turn, wait for the exact time to arrive, ' +
                   'sign and broadcast immediately, at %d' % self.env.now)
@@ -1,25 +1,34 @@
+import math
 import numpy as np
 from datetime import datetime
-from blocksim.utils import get_random_values, time, get_latency_delay
+from blocksim.utils import get_random_values, time, get_latency_delay, compile_distribution
 from blocksim.models.permissioned_network import PermissionedNetwork
 
 
 class PoETNetwork(PermissionedNetwork):
     def __init__(self, env, name):
         super().__init__(env, name)
+        self._wait_time_distribution = compile_distribution({
+            "name": "expon",
+            "parameters": "(0, 10)"
+        }, self.rng)
 
     def start_heartbeat(self):
         self._init_lists()
         empty_block = 0
         while True:
-            exponential_param = {
-                "name": "expon",
-                "parameters": "(0, 10)"
-            }
             # for authority in self._list_authority_nodes:
-            time_between_blocks = get_random_values(exponential_param, len(self._list_authority_nodes))
+            time_between_blocks = get_random_values(self._wait_time_distribution, len(self._list_authority_nodes))
             yield self.env.timeout(np.min(time_between_blocks))
             selected_node = self._list_authority_nodes[np.argmin(time_between_blocks)]
+            idle_delay = self._idle_delay(selected_node)
+            if idle_delay is not None:
+                # Nothing to put in the block, skip the round
+                if idle_delay == math.inf:
+                    break
+                if idle_delay:
+                    yield self.env.timeout(idle_delay)
+                continue
             if self.verbose:
                 print('If the signer is in-turn, wait for the exact time to arrive, ' +
                   'sign and broadcast immediately, at %d' % self.env.now)
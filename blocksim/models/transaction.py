@@ -1,4 +1,4 @@
-from blocksim.utils import keccak_256, encode_hex
+from blocksim.utils import get_identity
 
 
 class Transaction:
@@ -28,8 +28,19 @@ class Transaction:
 
     @property
     def hash(self):
-        """The transaction hash using Keccak 256"""
-        return encode_hex(keccak_256(str(self).encode('utf-8')))
+        """The transaction hash using Keccak 256 (or a sequential identity, see `set_identity_mode`),
+        computed once. After that the transaction can not be changed, so the hash is always valid."""
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = get_identity(self)
+            return self._hash
+
+    def __setattr__(self, name, value):
+        if '_hash' in self.__dict__:
+            raise AttributeError(
+                f'{self.__class__.__name__} is immutable once its hash is computed, can not set {name}')
+        super().__setattr__(name, value)
 
     def __repr__(self):
         """Returns a unambiguous representation of the transaction"""
@@ -46,6 +57,9 @@ class Transaction:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return hash(self.hash)
+
     def __lt__(self, other):
         return isinstance(other, self.__class__) and self.fee < other.fee
 
@@ -0,0 +1,118 @@
+import numpy as np
+from blocksim.utils import get_sequential_ids
+
+
+class TransactionTable:
+    """ Defines a columnar store of all the transactions of a simulation.
+
+    Instead of one `Transaction` object per transaction, each transaction is a row of a set of
+    numpy arrays, and it is referenced by its row index. A batch of transactions created together
+    is a contiguous `range` of rows, so queues, blocks and messages only carry indices.
+
+    :param int capacity: the initial number of rows, the columns double in size when full
+    """
+
+    COLUMNS = (
+        # Identity of the transaction, taken from the global counter of sequential identities
+        ('id', np.int64),
+        # Index of the node that created the transaction
+        ('origin', np.int32),
+        # Index of the destination node, -1 when not specified
+        ('destination', np.int32),
+        ('value', np.float64),
+        ('fee', np.float64),
+        # Simulation time when the transaction is injected in the network
+        ('created_at', np.float64)
+    )
+
+    def __init__(self, capacity=1024):
+        self._columns = {name: np.empty(capacity, dtype) for name, dtype in self.COLUMNS}
+        self._size = 0
+
+    def append(self, n: int, origin: int, destination: int, value: float, fee: float, created_at: float):
+        """Adds a batch of `n` transactions and returns their rows as a `range`"""
+        rows = range(self._size, self._size + n)
+        if rows.stop > len(self._columns['id']):
+            self._grow(rows.stop)
+        ids = get_sequential_ids(n)
+        self._columns['id'][rows.start:rows.stop] = np.arange(ids.start, ids.stop)
+        self._columns['origin'][rows.start:rows.stop] = origin
+        self._columns['destination'][rows.start:rows.stop] = destination
+        self._columns['value'][rows.start:rows.stop] = value
+        self._columns['fee'][rows.start:rows.stop] = fee
+        self._columns['created_at'][rows.start:rows.stop] = created_at
+        self._size = rows.stop
+        return rows
+
+    def column(self, name: str, rows=None):
+        """Returns the values of the column `name` for the given `rows` (a `range` or an array of
+        indices), or for all the rows. Ranges are returned as views, without copying."""
+        values = self._columns[name][:self._size]
+        if rows is None:
+            return values
+        if isinstance(rows, range):
+            return values[rows.start:rows.stop]
+        return values[rows]
+
+    def keys(self, rows):
+        """Returns the keys of the transactions in `rows`, as used by the propagation monitors"""
+        return [str(tx_id) for tx_id in self.column('id', rows).tolist()]
+
+    def _grow(self, size: int):
+        capacity = len(self._columns['id'])
+        while capacity < size:
+            capacity *= 2
+        for name, values in self._columns.items():
+            grown = np.empty(capacity, values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._columns[name] = grown
+
+    def __getitem__(self, row: int):
+        return TransactionView(self, row)
+
+    def __len__(self):
+        return self._size
+
+
+class TransactionView:
+    """ A lightweight view of one row of a `TransactionTable`, with the attributes of a `Transaction`
+
+    :param TransactionTable table: the table of the transaction
+    :param int row: the row index of the transaction in the table
+    """
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: TransactionTable, row: int):
+        self.table = table
+        self.row = row
+
+    def _get(self, name):
+        return self.table._columns[name][self.row].item()
+
+    @property
+    def hash(self):
+        return str(self._get('id'))
+
+    @property
+    def sender(self):
+        return self._get('origin')
+
+    @property
+    def to(self):
+        return self._get('destination')
+
+    @property
+    def value(self):
+        return self._get('value')
+
+    @property
+    def fee(self):
+        return self._get('fee')
+
+    @property
+    def created_at(self):
+        return self._get('created_at')
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}({self.hash})>'
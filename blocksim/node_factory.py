@@ -1,5 +1,4 @@
 from ast import literal_eval as make_tuple
-from random import randint
 from blocksim.models.bitcoin.node import BTCNode
 from blocksim.models.ethereum.node import ETHNode
 
@@ -38,8 +37,7 @@ class NodeFactory:
                 mega_hashrate_range = make_tuple(
                     _miners['mega_hashrate_range'])
                 # Choose a random value on MH/s range and convert to H/s
-                hashrate = randint(
-                    mega_hashrate_range[0], mega_hashrate_range[1])*10**6
+                hashrate = self._random_hashrate(mega_hashrate_range)
                 new = BTCNode(self._world.env,
                               self._network,
                               miner_location,
@@ -74,8 +72,7 @@ class NodeFactory:
                 mega_hashrate_range = make_tuple(
                     _miners['mega_hashrate_range'])
                 # Choose a random value on MH/s range and convert to H/s
-                hashrate = randint(
-                    mega_hashrate_range[0], mega_hashrate_range[1])*10**6
+                hashrate = self._random_hashrate(mega_hashrate_range)
                 new = ETHNode(self._world.env,
                               self._network,
                               miner_location,
@@ -100,6 +97,11 @@ class NodeFactory:
         print(f'NodeFactory: Created {len(nodes_list)} ethereum nodes')
         return nodes_list
 
+    def _random_hashrate(self, mega_hashrate_range):
+        """Chooses a random value on MH/s range and converts it to H/s"""
+        rng = self._world.env.rng.stream('node_factory')
+        return int(rng.integers(mega_hashrate_range[0], mega_hashrate_range[1], endpoint=True)) * 10**6
+
     def _check_location(self, miners, non_miners):
         nodes_location = list(miners.keys()) + list(non_miners)
         for location in nodes_location:
@@ -8,6 +8,8 @@ from blocksim.models.pbft_network import PBFTNetwork as Network
 from blocksim.permissioned_node_factory import PermNodeFactory
 from blocksim.pbft_transaction_factory import PBFTTransactionFactory
 from blocksim.world import SimulationWorld
+from blocksim.topology import create_topology
+from blocksim.termination import set_termination
 
 
 def write_report(world, prefix=''):
@@ -35,9 +37,9 @@ def report_node_chain(world, nodes_list):
         }
 
 
-def run_model(json_file='tx_count_100.json', day=1):
+def run_model(json_file='tx_count_100.json', day=1, seed=None):
     if day > 1:
-        run_model(json_file, day-1)
+        run_model(json_file, day-1, seed)
 
     now = int(time.time())  # Current time
     duration = 100  # seconds
@@ -50,7 +52,8 @@ def run_model(json_file='tx_count_100.json', day=1):
         Path.cwd() / 'dlasc-input-parameters' / 'throughput-received.json',
         Path.cwd() / 'dlasc-input-parameters' / 'throughput-sent.json',
         Path.cwd() / 'dlasc-input-parameters' / 'delays.json',
-        day
+        day,
+        seed
         )
 
     # Create the network
@@ -69,14 +72,18 @@ def run_model(json_file='tx_count_100.json', day=1):
     # Start the network heartbeat
     world.env.process(network.start_heartbeat())
 
-    # Full Connect all nodes
-    for node in nodes_list:
-        node.connect(nodes_list)
-        if day > 1:
+    # Connect the nodes with the topology of the configuration (a full mesh by default)
+    create_topology(world.env, nodes_list).connect(nodes_list)
+    if day > 1:
+        for node in nodes_list:
             node.restore_chains(day-1)
 
     transaction_factory = PBFTTransactionFactory(world)
     transaction_factory.broadcast(json_file, 0.0001, nodes_list)
+    # The network skips the idle rounds until the next injection of the factory (see "idle_fast_forward")
+    network.transaction_factory = transaction_factory
+    # Stop before the end of the duration on the conditions of the configuration, if any
+    set_termination(world, nodes_list, transaction_factory)
 
     world.start_simulation()
     report_node_chain(world, nodes_list)
@@ -1,7 +1,7 @@
+import heapq
 import json
 import string
 from pathlib import Path
-from random import choices, randint, random
 import simpy
 import numpy as np
 from blocksim.utils import time
@@ -20,6 +20,8 @@ class PBFTTransactionFactory(PermTransactionFactory):
 
     def __init__(self, world):
         super().__init__(world)
+        # Times of the injections scheduled by `_schedule`, a heap
+        self._injections = []
 
     def broadcast(self, json_file_name, interval, nodes_list):
         self.verbose = self._world.env.config["verbose"]
@@ -62,6 +64,9 @@ class PBFTTransactionFactory(PermTransactionFactory):
             'ethereum': self._generate_ethereum_tx
         }
 
+        # Columnar transaction store, `None` to create `Transaction` objects
+        table = self._world.env.transactions
+
         if paired:
             international_tx = 0
             for sender in paired_tx.keys():
@@ -71,17 +76,24 @@ class PBFTTransactionFactory(PermTransactionFactory):
                     i = int(sender)
                     j = int(j)
                     j = min(j, len(nodes_list) - 1)
-                    for _i in range(n_tx):
-                        sign = '-'.join([nodes_list[i].address, nodes_list[j].address, str(_i)])
-                        tx = blockchain_switcher.get(self._world.blockchain, lambda: "Invalid blockchain")(sign, i)
-                        transactions.append(tx)
+                    if table is not None:
+                        transactions = self._append_rows(transactions, n_tx, i, j, interval * i)
+                    else:
+                        for _i in range(n_tx):
+                            sign = '-'.join([nodes_list[i].address, nodes_list[j].address, str(_i)])
+                            tx = blockchain_switcher.get(self._world.blockchain, lambda: "Invalid blockchain")(sign, i)
+                            transactions.append(tx)
 
                     if nodes_list[i].address[7] != nodes_list[j].address[7]:
                         self._world.env.data['international_transactions'] += n_tx
 
-                self._world.env.process(self._set_interval(nodes_list[i], transactions, interval * i))
+                self._schedule(nodes_list[i], transactions, interval * i)
         else:
             for i in range(min(len(nodes_list), len(sum_tx))):
+                if table is not None:
+                    transactions = self._append_rows([], int(sum_tx[i]), i, -1, interval * i)
+                    self._schedule(nodes_list[i], transactions, interval * i)
+                    continue
                 transactions = []
                 for _i in range(sum_tx[i]):
                     # Generate a random string to a transaction be distinct from others
@@ -93,7 +105,16 @@ class PBFTTransactionFactory(PermTransactionFactory):
                     tx = blockchain_switcher.get(self._world.blockchain, lambda: "Invalid blockchain")(sign, i)
                     transactions.append(tx)
 
-                self._world.env.process(self._set_interval(nodes_list[i], transactions, interval * i))
+                self._schedule(nodes_list[i], transactions, interval * i)
+
+    def _schedule(self, node, tx, interval):
+        """Broadcasts the transactions `tx` from `node` after `interval` seconds"""
+        self.pending_transactions += len(tx)
+        heapq.heappush(self._injections, self._world.env.now + interval)
+        self._world.env.process(self._set_interval(node, tx, interval))
+
+    def next_injection(self):
+        return self._injections[0] if self._injections else None
 
     def _set_interval(self, node, tx, interval):
         event = simpy.events.Timeout(self._world.env, delay=interval, value=interval)
@@ -103,8 +124,19 @@ class PBFTTransactionFactory(PermTransactionFactory):
         if self.verbose:
             print(f'{time(self._world.env)}, now {value} seconds have passed')
         self._world.env.data['created_transactions'] += len(tx)
+        self.pending_transactions -= len(tx)
+        heapq.heappop(self._injections)
         # yield self._world.env.timeout(interval)
 
+    def _append_rows(self, transactions, n, origin, destination, delay):
+        """Appends `n` transactions to the transaction table and returns the rows of `transactions`
+        extended with them. Rows of the same origin are appended contiguously, so they stay a `range`."""
+        rows = self._world.env.transactions.append(
+            n, origin, destination, 140, 50, self._world.env.now + delay)
+        if not transactions:
+            return rows
+        return range(transactions.start, rows.stop)
+
     def _generate_pbft_tx(self, rand_sign, i):
         tx = Transaction('address', 'address', 140, rand_sign, 50)
         return tx
@@ -7,6 +7,8 @@ from blocksim.models.poa.poa_network import PoANetwork as Network
 from blocksim.permissioned_node_factory import PermNodeFactory
 from blocksim.permissioned_transaction_factory import PermTransactionFactory
 from blocksim.world import SimulationWorld
+from blocksim.topology import create_topology
+from blocksim.termination import set_termination
 
 
 def write_report(world):
@@ -36,7 +38,7 @@ def report_node_chain(world, nodes_list):
         }
 
 
-def run_model(json_file='tx_count_10000.json'):
+def run_model(json_file='tx_count_10000.json', seed=None):
     now = int(time.time())  # Current time
     duration = 3  # seconds
 
@@ -47,7 +49,8 @@ def run_model(json_file='tx_count_10000.json'):
         Path.cwd() / 'dlasc-input-parameters' / 'latency.json',
         Path.cwd() / 'dlasc-input-parameters' / 'throughput-received.json',
         Path.cwd() / 'dlasc-input-parameters' / 'throughput-sent.json',
-        Path.cwd() / 'dlasc-input-parameters' / 'delays.json'
+        Path.cwd() / 'dlasc-input-parameters' / 'delays.json',
+        seed=seed
         )
 
     # Create the network
@@ -79,12 +82,15 @@ def run_model(json_file='tx_count_10000.json'):
     nodes_list = node_factory.create_nodes(miners, non_miners)
     # Start the network heartbeat
     world.env.process(network.start_heartbeat())
-    # Full Connect all nodes
-    for node in nodes_list:
-        node.connect(nodes_list)
+    # Connect the nodes with the topology of the configuration (a full mesh by default)
+    create_topology(world.env, nodes_list).connect(nodes_list)
 
     transaction_factory = PermTransactionFactory(world)
     transaction_factory.broadcast(json_file, .1, nodes_list)
+    # The network skips the idle rounds until the next injection of the factory (see "idle_fast_forward")
+    network.transaction_factory = transaction_factory
+    # Stop before the end of the duration on the conditions of the configuration, if any
+    set_termination(world, nodes_list, transaction_factory)
 
     world.start_simulation()
     report_node_chain(world, nodes_list)
@@ -1,7 +1,6 @@
 import csv
 from pathlib import Path
 from ast import literal_eval as make_tuple
-from random import randint
 
 from blocksim.models.bitcoin.node import BTCNode
 from blocksim.models.ethereum.dlasc_node import ETHNode
@@ -87,6 +86,11 @@ class PermNodeFactory(NodeFactory):
             nodes_malicious = {rows[0]: rows[7] for rows in reader}
 
             print(node_region)
+        # `"malicious_authorities"` in the configuration overrides the malicious column of the file:
+        # the first authorities of the file are malicious, with the `"malicious_model"` (passive by default)
+        malicious_authorities = self._world.env.config.get('malicious_authorities')
+        malicious_model = MaliciousModel[self._world.env.config.get('malicious_model', 'passive').upper()]
+        authorities = 0
         # node_id = 0  # Unique ID for each node
         nodes_list = []
         replica_id = 0
@@ -94,6 +98,9 @@ class PermNodeFactory(NodeFactory):
             node_address = f'region_{region_id}-no_{node_id}'
             is_malicious = int(nodes_malicious[node_id])
             if int(region_id) <= 3:
+                if malicious_authorities is not None:
+                    is_malicious = malicious_model.value if authorities < malicious_authorities else 0
+                authorities += 1
                 # Create the authority nodes if node is in US
                 mega_hashrate_range = make_tuple('(20, 40)')
                 # Jiali: hashrate is no longer needed, but let's keep it in case.
@@ -134,8 +141,7 @@ class PermNodeFactory(NodeFactory):
                 # Create the miners nodes if node is in US
                 mega_hashrate_range = make_tuple('(20, 40)')
                 # Choose a random value on MH/s range and convert to H/s
-                hashrate = randint(
-                    mega_hashrate_range[0], mega_hashrate_range[1]) * 10 ** 6
+                hashrate = self._random_hashrate(mega_hashrate_range)
                 new = ETHNode(self._world.env,
                               self._network,
                               region_id,
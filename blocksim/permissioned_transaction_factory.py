@@ -1,6 +1,5 @@
 import json
 from pathlib import Path
-from random import choices, randint
 from blocksim.transaction_factory import TransactionFactory
 import numpy as np
 
@@ -26,7 +25,8 @@ class PermTransactionFactory(TransactionFactory):
         if not path.exists():
             raise Exception('Wrong working dir. Should be perm-blocksim')
         with path.open() as f:
-            today = 'DAY ' + str(randint(0, 180 - 1)) + ' '
+            rng = self._world.env.rng.stream('transaction_factory')
+            today = 'DAY ' + str(rng.integers(0, 180)) + ' '
             # today = 'DAY 5 '
 
             # only one day's tx is too little...
@@ -0,0 +1,188 @@
+from collections import Counter, defaultdict
+from functools import wraps
+from time import perf_counter
+import simpy
+from simpy.events import Process
+from blocksim import utils
+from blocksim.models import block, chain, node, permissioned_node, transaction
+from blocksim.models import permissoned_transaction_queue, transaction_queue
+
+
+class ProfiledEnvironment(simpy.Environment):
+    """ SimPy environment that counts the events scheduled and processed, by type of event, the
+    wall-clock time spent processing them, and the processes spawned, by generator. The events
+    that carry a message envelope (e.g. the timeout of a delivery or the get of an inbox) are also
+    counted by message id and destination node."""
+
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        self.scheduled_events = Counter()
+        self.processed_events = Counter()
+        self.event_seconds = defaultdict(float)
+        self.spawned_processes = Counter()
+        # Events that carry a message, by (message id, destination node address)
+        self.message_events = defaultdict(lambda: {'scheduled': 0, 'processed': 0, 'seconds': 0.0})
+
+    def schedule(self, event, priority=simpy.core.NORMAL, delay=0):
+        self.scheduled_events[type(event).__name__] += 1
+        message_key = self._message_key(event)
+        if message_key is not None:
+            self.message_events[message_key]['scheduled'] += 1
+        super().schedule(event, priority, delay)
+
+    def step(self):
+        event = self._queue[0][3] if self._queue else None
+        event_type = type(event).__name__ if event is not None else None
+        message_key = self._message_key(event)
+        start = perf_counter()
+        super().step()
+        seconds = perf_counter() - start
+        self.processed_events[event_type] += 1
+        self.event_seconds[event_type] += seconds
+        if message_key is not None:
+            stats = self.message_events[message_key]
+            stats['processed'] += 1
+            stats['seconds'] += seconds
+
+    @staticmethod
+    def _message_key(event):
+        """Returns the (message id, destination node address) of the envelope that is the value of
+        the `event`, or `None` when its value is not an envelope"""
+        envelope = getattr(event, '_value', None)
+        msg = getattr(envelope, 'msg', None)
+        destination = getattr(envelope, 'destination', None)
+        if msg is None or destination is None:
+            return None
+        return msg['id'], destination.address
+
+    def process(self, generator):
+        self.spawned_processes[getattr(generator, '__qualname__', type(generator).__name__)] += 1
+        return Process(self, generator)
+
+
+class Profiler:
+    """ Defines the opt-in instrumentation of a simulation, enabled with `"profile": true`.
+
+    Besides the events and processes counted by the `ProfiledEnvironment`, it times the calls of
+    each phase of the simulation, listed in `PHASES`, by wrapping their functions while the
+    simulation runs, and counts the messages handled by each node. Phases can be nested (e.g. a
+    block is hashed when it is inserted in the chain) and their times include the nested phases,
+    while the nested calls of a phase to itself are only counted once.
+
+    :param ProfiledEnvironment env: the environment of the simulation
+    """
+
+    PHASES = {
+        'sampling': (
+            (utils.Distribution, 'sample'),
+            (utils.Distribution, 'rvs'),
+            (utils.Distribution, '_refill'),
+            (utils.EmpiricalDistribution, 'rvs'),
+            (utils.CompositeDelay, 'sample'),
+            (utils.CompositeDelay, 'sample_many'),
+            (utils.CompositeDelay, '_refill')),
+        'hashing': (
+            (transaction, 'get_identity'),
+            (block, 'get_identity')),
+        'chain_insert': (
+            (chain.Chain, 'add_block'),),
+        'queue_ops': (
+            (permissoned_transaction_queue.TransactionQueue, 'put'),
+            (permissoned_transaction_queue.TransactionQueue, 'get_many'),
+            (permissoned_transaction_queue.TransactionQueue, 'add_txs'),
+            (permissoned_transaction_queue.TransactionQueue, 'remove_txs'),
+            (permissoned_transaction_queue.TransactionRowQueue, 'put'),
+            (permissoned_transaction_queue.TransactionRowQueue, 'get_many'),
+            (transaction_queue.TransactionQueue, 'put'),
+            (transaction_queue.TransactionQueue, 'get')),
+        'monitoring': (
+            (node.Node, '_monitor_received'),
+            (node.Node, '_monitor_sent'),
+            (permissioned_node.PermNode, '_monitor_received'),
+            (permissioned_node.PermNode, '_monitor_sent'))
+    }
+
+    def __init__(self, env: ProfiledEnvironment):
+        self.env = env
+        self._phases = {phase: {'calls': 0, 'seconds': 0.0} for phase in self.PHASES}
+        # Messages handled by each node, by message id
+        self._messages = defaultdict(Counter)
+        # Number of messages and seconds spent by the handlers, by message id, for all the nodes
+        self._handled_messages = defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+        # Functions replaced while the simulation runs: (owner, name, original)
+        self._originals = []
+        self._wall_seconds = 0.0
+
+    def run(self, until=None):
+        """Runs the simulation of the environment with the phases instrumented"""
+        self._install()
+        start = perf_counter()
+        try:
+            return self.env.run(until=until)
+        finally:
+            self._wall_seconds += perf_counter() - start
+            self._uninstall()
+
+    def count_message(self, node_address: str, message_id: str, seconds: float):
+        """Counts a message handled by a node, and the `seconds` spent by its handler"""
+        self._messages[node_address][message_id] += 1
+        stats = self._handled_messages[message_id]
+        stats['count'] += 1
+        stats['seconds'] += seconds
+
+    def report(self):
+        """Returns the profile section of the report"""
+        env = self.env
+        return {
+            'wall_seconds': self._wall_seconds,
+            'events': {
+                event_type: {
+                    'scheduled': env.scheduled_events[event_type],
+                    'processed': env.processed_events[event_type],
+                    'seconds': env.event_seconds[event_type]
+                } for event_type in sorted(set(env.scheduled_events) | set(env.processed_events), key=str)
+            },
+            'message_events': self._message_events(),
+            'processes': dict(env.spawned_processes.most_common()),
+            'phases': self._phases,
+            'handled_messages': dict(self._handled_messages),
+            'messages_by_node': {address: dict(counts) for address, counts in self._messages.items()}
+        }
+
+    def _message_events(self):
+        """The events that carry a message, by message id and then by destination node"""
+        events = defaultdict(dict)
+        for (message_id, address), stats in sorted(self.env.message_events.items(), key=str):
+            events[message_id][address] = stats
+        return dict(events)
+
+    def _install(self):
+        for phase, functions in self.PHASES.items():
+            stats = self._phases[phase]
+            # Calls in progress of the phase, so the nested calls are not counted twice
+            depth = [0]
+            for owner, name in functions:
+                original = vars(owner)[name]
+                setattr(owner, name, self._timed(original, stats, depth))
+                self._originals.append((owner, name, original))
+
+    def _uninstall(self):
+        while self._originals:
+            owner, name, original = self._originals.pop()
+            setattr(owner, name, original)
+
+    @staticmethod
+    def _timed(function, stats, depth):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            if depth[0]:
+                return function(*args, **kwargs)
+            depth[0] += 1
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                stats['calls'] += 1
+                stats['seconds'] += perf_counter() - start
+        return timed
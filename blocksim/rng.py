@@ -0,0 +1,44 @@
+import zlib
+import numpy as np
+
+
+class RandomStreams:
+    """ Defines the random number generation service of the simulation world.
+
+    Every source of randomness (a node, a link between two locations or a subsystem, such as the
+    network heartbeat or the transaction factory) draws from its own independent stream. All the
+    streams are spawned from a single root seed, so two runs with the same seed are identical.
+    A stream only depends on its key, not on the order in which the streams are requested.
+
+    :param seed: the root seed (an `int` or a `numpy.random.SeedSequence`). If `None`, fresh entropy
+    is taken from the operating system and can be read back from `seed` to reproduce the run.
+    """
+
+    def __init__(self, seed=None):
+        if isinstance(seed, np.random.SeedSequence):
+            self._seed_sequence = seed
+        else:
+            self._seed_sequence = np.random.SeedSequence(seed)
+        self._streams = {}
+
+    @property
+    def seed(self):
+        """The root entropy of all the streams"""
+        return self._seed_sequence.entropy
+
+    def stream(self, *key):
+        """Returns the random generator of the stream identified by `key`,
+        e.g. `stream('node', address)` or `stream('LATENCIES', origin, destination)`"""
+        generator = self._streams.get(key)
+        if generator is None:
+            spawn_key = tuple(zlib.crc32(str(part).encode('utf-8')) for part in key)
+            seed_sequence = np.random.SeedSequence(
+                self._seed_sequence.entropy,
+                spawn_key=self._seed_sequence.spawn_key + spawn_key)
+            generator = np.random.Generator(np.random.PCG64(seed_sequence))
+            self._streams[key] = generator
+        return generator
+
+    def spawn(self, n: int):
+        """Returns `n` independent child seeds, e.g. to run replications in parallel processes"""
+        return self._seed_sequence.spawn(n)
@@ -0,0 +1,184 @@
+""" Parameter sweeps of the permissioned simulations, with a cache of the results.
+
+A sweep runs a replication (see `blocksim.experiments`) for each point of a grid, the product of
+the values of each axis in `AXES`, e.g.
+
+    from blocksim.sweep import run_sweep
+
+    if __name__ == '__main__':
+        results = run_sweep('dlasc-input-parameters/config.json', {
+            'workload': [f'tx_count_{i}000.json' for i in range(1, 11)],
+            'protocol': ['pbft'],
+            'malicious_authorities': [0, 1, 2, 3, 4, 5],
+            'block_size_limit_mb': [1, 2],
+            'seed': [0, 1, 2]
+        })
+
+The axes left out of the grid keep the value of the base configuration. Each result is cached
+under a content hash of the configuration of its point, of the files the simulation reads, of the
+code of `blocksim` and of the seed, so running a sweep again only runs the points that changed.
+"""
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from blocksim.experiments import METRICS, load_config, run_replication, summarize
+
+# Axes of the grid of a sweep, in the order the points are enumerated
+AXES = ('workload', 'protocol', 'malicious_authorities', 'block_size_limit_mb', 'seed')
+# Files read by the simulations, besides the input parameters and the workload
+INPUT_FILES = (
+    'blocksim/Test_DLA1_Input.csv',
+    'blocksim/Test_DLA2_Input.csv',
+    'supply-chain-input-data/tx_dict.json'
+)
+DEFAULT_CACHE = Path('blocksim') / 'output' / 'sweep_cache'
+DEFAULT_WORKLOAD = 'tx_count_100.json'
+
+
+def grid_points(grid: dict):
+    """Returns the points of the `grid`, a dict of the values of each axis of `AXES`. Malicious
+    authorities are only modeled by PBFT, so the other protocols only get the points without"""
+    unknown = set(grid) - set(AXES)
+    if unknown:
+        raise ValueError(f'Unknown axes {sorted(unknown)}, the axes of a sweep are {AXES}')
+    axes = [axis for axis in AXES if axis in grid]
+    points = []
+    for values in itertools.product(*(grid[axis] for axis in axes)):
+        point = dict(zip(axes, values))
+        if point.get('protocol', 'pbft') != 'pbft' and point.get('malicious_authorities'):
+            continue
+        points.append(point)
+    return points
+
+
+def point_config(base_config: dict, point: dict):
+    """Returns the configuration of the `point`: the base configuration with the protocol, the
+    malicious authorities and the block size limit of the point"""
+    config = json.loads(json.dumps(base_config))
+    protocol = config['blockchain'] = point.get('protocol', config['blockchain'])
+    if 'malicious_authorities' in point:
+        config['malicious_authorities'] = point['malicious_authorities']
+    if 'block_size_limit_mb' in point:
+        config[protocol]['block_size_limit_mb'] = point['block_size_limit_mb']
+    return config
+
+
+def code_version(package=Path(__file__).parent):
+    """Content hash of the Python sources of the `package`"""
+    digest = hashlib.sha256()
+    for path in sorted(Path(package).rglob('*.py')):
+        digest.update(path.relative_to(package).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _files_digest(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def cache_key(config: dict, seed: int, workload: str, run_arguments: dict, input_parameters: str, version: str):
+    """Content hash of a run: its configuration, the files it reads, the code version and its seed"""
+    files = [Path(input_parameters) / name for name in
+             ('latency.json', 'throughput-received.json', 'throughput-sent.json', 'delays.json')]
+    files += [Path(name) for name in INPUT_FILES]
+    files.append(Path('supply-chain-input-data') / workload)
+    content = json.dumps({
+        'config': config,
+        'seed': seed,
+        'workload': workload,
+        'run': run_arguments,
+        'files': _files_digest(files),
+        'code': version
+    }, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultCache:
+    """Results of the runs of the sweeps, one JSON file per content hash in the `directory`"""
+
+    def __init__(self, directory=DEFAULT_CACHE):
+        self.directory = Path(directory)
+
+    def get(self, key: str):
+        path = self.directory / f'{key}.json'
+        if not path.exists():
+            return None
+        with path.open() as f:
+            return json.load(f)
+
+    def put(self, key: str, result: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Written aside and then renamed, so an interrupted sweep does not leave a partial result
+        path = self.directory / f'{key}.json'
+        tmp_path = path.with_suffix('.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def run_sweep(base_config, grid: dict, workers: int = None, cache_dir=DEFAULT_CACHE, duration=100,
+              input_parameters='dlasc-input-parameters', confidence=0.95):
+    """Runs the points of the `grid` (see `grid_points`) that are not in the cache yet on `workers`
+    processes (all the cores by default), as in `run_replications`.
+
+    Returns the `runs`, the metrics of each point with a `cached` flag, and the `summary` of the
+    metrics of the points that differ only by their seed"""
+    base_config = load_config(base_config)
+    cache = ResultCache(cache_dir)
+    version = code_version()
+    run_arguments = {'duration': duration, 'input_parameters': input_parameters}
+    runs = []
+    missing = []
+    for point in grid_points(grid):
+        config = point_config(base_config, point)
+        seed = point.get('seed', config.get('seed'))
+        if seed is None:
+            raise ValueError('The runs of a sweep need a seed, from the grid or the configuration')
+        workload = point.get('workload', DEFAULT_WORKLOAD)
+        key = cache_key(config, seed, workload, run_arguments, input_parameters, version)
+        result = cache.get(key)
+        runs.append(dict(point, cached=result is not None, **(result or {})))
+        if result is None:
+            missing.append((len(runs) - 1, key, config, seed, workload))
+
+    if missing:
+        workers = min(workers or os.cpu_count() or 1, len(missing))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(index, key, executor.submit(run_replication, config, seed, workload, **run_arguments))
+                       for index, key, config, seed, workload in missing]
+            for index, key, future in futures:
+                result = future.result()
+                cache.put(key, result)
+                runs[index].update(result)
+
+    return {
+        'runs': runs,
+        'summary': summarize_points(runs, confidence)
+    }
+
+
+def summarize_points(runs: list, confidence=0.95):
+    """Summarizes the metrics of the runs of each point of the grid over its seeds"""
+    groups = {}
+    for run in runs:
+        point = tuple((axis, run[axis]) for axis in AXES if axis in run and axis != 'seed')
+        groups.setdefault(point, []).append(run)
+    return [dict(point, runs=len(group), **summarize(group, confidence)) for point, group in groups.items()]
+
+
+def write_csv(runs: list, path):
+    """Writes the `runs` of a sweep as a CSV file, one row per run"""
+    columns = [axis for axis in AXES if any(axis in run for run in runs)]
+    columns += ['termination', *METRICS, 'cached']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(runs)
@@ -0,0 +1,106 @@
+""" Stop conditions of a simulation, registered with `SimulationWorld.stop_when`.
+
+Each function below returns a predicate, called without arguments when the simulation starts and
+whenever a block is added to a chain, that holds once the simulation can stop before the end of its
+duration. The conditions on the chains are checked on the authority nodes, or on all the nodes when
+none of them is an authority.
+
+The conditions on the transactions only hold once every created transaction is committed, which
+may never happen: e.g. the PBFT primary does not queue the transactions injected at itself.
+"""
+
+
+def _authorities(nodes: list):
+    authorities = [node for node in nodes if getattr(node, 'is_authority', False)]
+    return authorities or list(nodes)
+
+
+def _honest(nodes: list):
+    """The `nodes` that are not malicious, as the passive malicious PBFT authorities stall"""
+    # Imported here, as the PBFT network depends on the permissioned network, which uses this module
+    from blocksim.models.pbft_network import MaliciousModel
+    return [node for node in nodes if getattr(node, 'is_malicious', MaliciousModel.NOT_MALICIOUS)
+            == MaliciousModel.NOT_MALICIOUS]
+
+
+def _committed(env, authorities, transaction_factory, quantifier):
+    # Created on the first check, when the simulation starts after the chains are restored
+    counters = []
+
+    def predicate():
+        if not counters:
+            counters.extend(CommittedTransactions(node.chain) for node in authorities)
+        if transaction_factory.pending_transactions:
+            return False
+        created = env.data['created_transactions']
+        return quantifier(counter.count() >= created for counter in counters)
+    return predicate
+
+
+def transactions_committed(env, nodes: list, transaction_factory):
+    """All the transactions of the `transaction_factory` were created and are in the chain of every
+    honest authority. The malicious authorities are left out, as they can stall for good"""
+    return _committed(env, _honest(_authorities(nodes)), transaction_factory, all)
+
+
+def queue_drained(env, nodes: list, transaction_factory):
+    """All the transactions of the `transaction_factory` were created and taken out of the queues
+    into blocks, so they are in the chain of at least one authority. Unlike
+    `transactions_committed`, it does not wait for the authorities that lag behind"""
+    return _committed(env, _authorities(nodes), transaction_factory, any)
+
+
+def block_height(nodes: list, height: int):
+    """The chain of every authority has at least `height` blocks after the genesis block"""
+    authorities = _authorities(nodes)
+
+    def predicate():
+        return all(node.chain.head.header.number >= height for node in authorities)
+    return predicate
+
+
+def set_termination(world, nodes: list, transaction_factory):
+    """Registers the stop conditions set by `"termination"` in the configuration, e.g.
+    `{"transactions_committed": true, "block_height": 50}`. The wall-clock budget and its check
+    interval are read by the `SimulationWorld` itself"""
+    config = world.env.config.get('termination', {})
+    if config.get('transactions_committed', False):
+        world.stop_when(transactions_committed(world.env, nodes, transaction_factory), 'transactions_committed')
+    if config.get('queue_drained', False):
+        world.stop_when(queue_drained(world.env, nodes, transaction_factory), 'queue_drained')
+    if config.get('block_height') is not None:
+        world.stop_when(block_height(nodes, config['block_height']), 'block_height')
+
+
+class CommittedTransactions:
+    """Counts the distinct transactions of the blocks appended to a chain after its current head,
+    going only through the blocks appended since the last count. A transaction proposed again in a
+    later block (e.g. by the new primary after a PBFT view change) is only counted once."""
+
+    def __init__(self, chain):
+        self._chain = chain
+        self._start = chain.head.header.number
+        self._number = self._start
+        self._hash = chain.head.header.hash
+        # Identities of the transactions counted: hashes, or rows of the transaction table
+        self._seen = set()
+
+    def count(self):
+        chain = self._chain
+        head = chain.head.header.number
+        if head == self._number and chain.get_blockhash_by_number(head) == self._hash:
+            return len(self._seen)
+        if chain.get_blockhash_by_number(self._number) != self._hash:
+            # The chain was reorganized below the last counted block
+            self._number, self._hash = self._start, chain.get_blockhash_by_number(self._start)
+            self._seen.clear()
+        for number in range(self._number + 1, head + 1):
+            block = chain.get_block_by_number(number)
+            transactions = block.transactions
+            if isinstance(transactions, list):
+                self._seen.update(tx.hash for tx in transactions)
+            elif transactions is not None:
+                self._seen.update(transactions.tolist() if hasattr(transactions, 'tolist') else transactions)
+            self._hash = block.header.hash
+        self._number = head
+        return len(self._seen)
@@ -0,0 +1,203 @@
+import numpy as np
+
+# Attempts of the random pairing of `random_regular` before giving up
+MAX_PAIRING_ATTEMPTS = 100
+
+
+class Topology:
+    """ Defines which nodes each node of the network connects to.
+
+    The adjacency is stored in compressed sparse row (CSR) form: the peers of the node at index `i`
+    are `indices[indptr[i]:indptr[i + 1]]`, in ascending order. The generators below build
+    undirected graphs, where each edge is stored in both directions, so two peers can message each
+    other. Nodes are referenced by their index in the list of nodes of the simulation.
+
+    :param indptr: array of `n + 1` offsets in `indices`
+    :param indices: array of the peers of all the nodes, one node after the other
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+
+    @classmethod
+    def from_edges(cls, n: int, sources, targets):
+        """Creates the topology of `n` nodes with an undirected edge between each pair of `sources`
+        and `targets`"""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        rows = np.concatenate((sources, targets))
+        columns = np.concatenate((targets, sources))
+        order = np.lexsort((columns, rows))
+        rows, columns = rows[order], columns[order]
+        # Drop the edges given twice
+        unique = np.ones(len(rows), dtype=bool)
+        unique[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        rows, columns = rows[unique], columns[unique]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(indptr, columns)
+
+    def peers(self, i: int):
+        """Returns the indices of the peers of the node `i`"""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degrees(self):
+        """Returns the number of peers of each node"""
+        return np.diff(self.indptr)
+
+    @property
+    def number_of_connections(self):
+        """Number of directed connections, twice the number of edges"""
+        return len(self.indices)
+
+    def with_mesh(self, members):
+        """Returns this topology with the nodes of the indices `members` also connected to each other"""
+        members = np.asarray(members, dtype=np.int64)
+        mesh = full_mesh(len(members))
+        sources = np.concatenate((np.repeat(np.arange(len(self)), self.degrees()), np.repeat(members, mesh.degrees())))
+        targets = np.concatenate((self.indices, members[mesh.indices]))
+        return Topology.from_edges(len(self), sources, targets)
+
+    def connect(self, nodes: list):
+        """Connects each of the `nodes` to its peers"""
+        if len(nodes) != len(self):
+            raise ValueError(f'The topology has {len(self)} nodes, not {len(nodes)}')
+        for i, node in enumerate(nodes):
+            node.connect([nodes[j] for j in self.peers(i).tolist()])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+
+def full_mesh(n: int):
+    """Every node connects to all the others"""
+    indices = np.tile(np.arange(n - 1), n)
+    # Skip the node itself: the peers of `i` are 0..i-1 and i+1..n-1
+    indices += indices >= np.repeat(np.arange(n), n - 1)
+    return Topology(np.arange(n + 1) * (n - 1), indices)
+
+
+def random_regular(n: int, k: int, rng: np.random.Generator):
+    """Every node connects to `k` random peers. The edges are paired at random, and the pairs that
+    would be a self-loop or a duplicate are paired again, so `n * k` must be even"""
+    if k >= n or (n * k) % 2:
+        raise ValueError(f'There is no {k}-regular graph of {n} nodes')
+    for _ in range(MAX_PAIRING_ATTEMPTS):
+        edges = _pair_stubs(n, k, rng)
+        if edges is not None:
+            sources, targets = zip(*edges) if edges else ((), ())
+            return Topology.from_edges(n, sources, targets)
+    raise RuntimeError(f'Could not pair a {k}-regular graph of {n} nodes')
+
+
+def _pair_stubs(n, k, rng):
+    edges = set()
+    stubs = np.repeat(np.arange(n), k)
+    while len(stubs):
+        rng.shuffle(stubs)
+        left = []
+        for u, v in stubs.reshape(-1, 2).tolist():
+            edge = (min(u, v), max(u, v))
+            if u == v or edge in edges:
+                left += (u, v)
+            else:
+                edges.add(edge)
+        if len(left) == len(stubs):
+            # None of the remaining stubs can be paired
+            return None
+        stubs = np.array(left, dtype=np.int64)
+    return edges
+
+
+def region_clustered(regions: list, hubs: list, k: int = 1, rng: np.random.Generator = None, mesh_regions=False):
+    """Clusters the nodes around the hub nodes (e.g. the authorities): the hubs connect to each
+    other, and every other node connects to `k` hubs, first the hubs of its own region and then
+    random hubs of the other regions.
+
+    :param regions: the region of each node, e.g. the `location` of the nodes
+    :param hubs: whether each node is a hub
+    :param int k: number of hubs of each node that is not a hub
+    :param bool mesh_regions: also connect all the nodes of the same region to each other
+    """
+    regions = np.asarray(regions)
+    hubs = np.asarray(hubs, dtype=bool)
+    hub_indices = np.flatnonzero(hubs)
+    if len(hub_indices) == 0:
+        raise ValueError('A region clustered topology needs at least one hub')
+    if rng is None:
+        rng = np.random.default_rng()
+    k = min(k, len(hub_indices))
+    sources, targets = [], []
+    # The hubs connect to each other
+    mesh = full_mesh(len(hub_indices))
+    sources.append(np.repeat(hub_indices, mesh.degrees()))
+    targets.append(hub_indices[mesh.indices])
+    for i in np.flatnonzero(~hubs).tolist():
+        local = hub_indices[regions[hub_indices] == regions[i]]
+        remote = hub_indices[regions[hub_indices] != regions[i]]
+        chosen = rng.permutation(local)[:k]
+        if len(chosen) < k:
+            chosen = np.concatenate((chosen, rng.choice(remote, k - len(chosen), replace=False)))
+        sources.append(np.full(len(chosen), i))
+        targets.append(chosen)
+    if mesh_regions:
+        for region in np.unique(regions):
+            members = np.flatnonzero(regions == region)
+            mesh = full_mesh(len(members))
+            sources.append(np.repeat(members, mesh.degrees()))
+            targets.append(members[mesh.indices])
+    return Topology.from_edges(len(regions), np.concatenate(sources), np.concatenate(targets))
+
+
+def small_world(n: int, k: int, p: float, rng: np.random.Generator):
+    """Watts-Strogatz small-world graph: a ring where every node connects to its `k` nearest
+    neighbours (`k` even), and then each edge is rewired to a random node with probability `p`"""
+    if k % 2 or k >= n:
+        raise ValueError(f'The number of neighbours of a small world must be even and lower than {n}, not {k}')
+    edges = {(u, (u + j) % n) for j in range(1, k // 2 + 1) for u in range(n)}
+    neighbours = {u: set() for u in range(n)}
+    for u, v in edges:
+        neighbours[u].add(v)
+        neighbours[v].add(u)
+    for j in range(1, k // 2 + 1):
+        for u in range(n):
+            v = (u + j) % n
+            if rng.random() >= p or len(neighbours[u]) >= n - 1:
+                continue
+            w = int(rng.integers(n))
+            while w == u or w in neighbours[u]:
+                w = int(rng.integers(n))
+            edges.discard((u, v))
+            neighbours[u].discard(v)
+            neighbours[v].discard(u)
+            edges.add((u, w))
+            neighbours[u].add(w)
+            neighbours[w].add(u)
+    sources, targets = zip(*edges)
+    return Topology.from_edges(n, sources, targets)
+
+
+def create_topology(env, nodes: list):
+    """Creates the topology of the `nodes` set by `"topology"` in the configuration, a full mesh by
+    default. E.g. `{"name": "random_regular", "k": 4}`, `{"name": "small_world", "k": 4, "p": 0.1}`
+    or `{"name": "region_clustered", "k": 2}`, where the hubs are the authority (or miner) nodes.
+
+    The authorities of the permissioned protocols only send their consensus messages to their
+    peers, so the random graphs also connect all the authorities to each other"""
+    config = dict(env.config.get('topology', {'name': 'full_mesh'}))
+    name = config.pop('name')
+    rng = env.rng.stream('topology')
+    n = len(nodes)
+    authorities = [i for i, node in enumerate(nodes) if getattr(node, 'is_authority', False)]
+    if name == 'full_mesh':
+        return full_mesh(n)
+    if name == 'random_regular':
+        return random_regular(n, config['k'], rng).with_mesh(authorities)
+    if name == 'small_world':
+        return small_world(n, config['k'], config['p'], rng).with_mesh(authorities)
+    if name == 'region_clustered':
+        regions = [node.location for node in nodes]
+        hubs = [getattr(node, 'is_authority', getattr(node, 'is_mining', False)) for node in nodes]
+        return region_clustered(regions, hubs, config.get('k', 1), rng, config.get('mesh_regions', False))
+    raise ValueError(f'Unknown topology {name!r}')
@@ -1,5 +1,4 @@
 import string
-from random import randint, choices
 from blocksim.models.transaction import Transaction
 from blocksim.models.ethereum.transaction import Transaction as ETHTransaction
 
@@ -14,14 +13,17 @@ class TransactionFactory:
 
     def __init__(self, world):
         self._world = world
+        # Transactions created but not broadcast yet, which are counted in `created_transactions` when broadcast
+        self.pending_transactions = 0
 
     def broadcast(self, number_of_batches, transactions_per_batch, interval, nodes_list):
+        rng = self._world.env.rng.stream('transaction_factory')
         for i in range(number_of_batches):
             transactions = []
             for _i in range(transactions_per_batch):
                 # Generate a random string to a transaction be distinct from others
                 rand_sign = ''.join(
-                    choices(string.ascii_letters + string.digits, k=20))
+                    rng.choice(list(string.ascii_letters + string.digits), 20))
                 if self._world.blockchain == 'bitcoin':
                     tx = Transaction('address', 'address', 140, rand_sign, 50)
                 elif self._world.blockchain == 'ethereum':
@@ -32,8 +34,12 @@ class TransactionFactory:
             self._world.env.data['created_transactions'] += len(transactions)
             # Choose a random node to broadcast the transaction
             self._world.env.process(
-                nodes_list[randint(0, len(nodes_list)-1)].broadcast_transactions(transactions))
+                nodes_list[rng.integers(len(nodes_list))].broadcast_transactions(transactions))
             self._world.env.process(self._set_interval(interval))
 
+    def next_injection(self):
+        """Time when the next transactions are broadcast, `None` when all of them already were"""
+        return None
+
     def _set_interval(self, interval):
         yield self._world.env.timeout(interval)
@@ -1,8 +1,10 @@
 import binascii
+import re
 from datetime import datetime
-import random
+from pathlib import Path
 from ast import literal_eval as make_tuple
 import scipy.stats
+import numpy as np
 try:
     from Crypto.Hash import keccak
 
@@ -14,12 +16,27 @@ except ImportError:
     def keccak_256(value):
         return _sha3.keccak_256(value).digest()
 
+# Identities of transactions and block headers: Keccak 256 hashes (default) or integers from a counter
+IDENTITY_MODES = ('keccak', 'sequential')
+_identity_mode = IDENTITY_MODES[0]
+# Next value of the global counter of the `sequential` identities, 0 is reserved for the genesis blocks
+_next_sequential_id = 1
+# Round-trip time of each reply in a ping trace, e.g. `64 bytes from ...: icmp_seq=1 ttl=63 time=0.869 ms`
+_PING_TIME = re.compile(r'time=([0-9.]+) ms')
+# Number of random values drawn at once when a distribution pool is refilled for the first time
+SAMPLE_POOL_INITIAL_SIZE = 1024
+# Maximum number of random values drawn at once (the pool size doubles on every refill until here)
+SAMPLE_POOL_MAX_SIZE = 65536
+
 
 def get_latency_delay(env, origin: str, destination: str, n=1):
     distribution = env.delays['LATENCIES'][origin][destination]
+    if n == 1:
+        # Convert latency in ms to seconds
+        return round(distribution.sample() / 1000, 4)
     # Convert latency in ms to seconds
     latencies = [
-        latency/1000 for latency in get_random_values(distribution, n)]
+        latency/1000 for latency in distribution.rvs(n)]
     if len(latencies) == 1:
         return round(latencies[0], 4)
     else:
@@ -58,14 +75,47 @@ def get_sent_delay(env, message_size: float, origin: str, destination: str, n=1)
     If `n` is 1 it returns a `float`, if `n > 1` returns an array of `n` floats.
     """
     distribution = env.delays['THROUGHPUT_SENT'][origin][destination]
-    delay = -1
-    while delay < 0:
-        delay = _calc_throughput(distribution, message_size, n)
-    return delay
+    return _calc_throughput(distribution, message_size, n)
+
+
+def get_composite_delay(env, message_size: float, origin: str, destination: str):
+    """
+    It calculates and returns the three delays of a message with a certain size (`message_size`)
+    sent from one location to another, drawn together from the link `CompositeDelay`
+
+    :param message_size: message size in megabytes (MB)
+    :param origin: the location of the origin node
+    :param destination: the location of the destination node
+
+    Returns a tuple `(sent_delay, latency_delay, received_delay)`, all in seconds.
+    """
+    return env.delays['COMPOSITE'][origin][destination].sample(message_size)
+
 
+def get_multicast_delays(env, message_size: float, origin: str, destinations: list):
+    """
+    It calculates the three delays of a message with a certain size (`message_size`) sent from
+    one location to each of the `destinations` locations. The destinations are grouped by location,
+    and the delays of each group are drawn at once from the link `CompositeDelay`
+
+    Returns a list with a tuple `(sent_delay, latency_delay, received_delay)` per destination, in seconds.
+    """
+    links = env.delays['COMPOSITE'][origin]
+    positions = {}
+    for position, destination in enumerate(destinations):
+        positions.setdefault(destination, []).append(position)
+    delays = [None] * len(destinations)
+    for destination, destination_positions in positions.items():
+        for position, sample in zip(destination_positions,
+                                    links[destination].sample_many(message_size, len(destination_positions))):
+            delays[position] = sample
+    return delays
 
-def _calc_throughput(distribution: dict, message_size: float, n):
-    rand_throughputs = get_random_values(distribution, n)
+
+def _calc_throughput(distribution, message_size: float, n):
+    if n == 1:
+        return round((message_size * 8) / distribution.sample(), 3)
+    rand_throughputs = distribution.rvs(n)
     delays = []
     for throughput in rand_throughputs:
         delay = (message_size * 8) / throughput
@@ -84,12 +134,364 @@ def kB_to_MB(value):
     return value / 1000
 
 
-def get_random_values(distribution: dict, n=1):
+def _sample_norm(random_state, shapes, n):
+    return random_state.standard_normal(n)
+
+
+def _sample_lognorm(random_state, shapes, n):
+    return random_state.lognormal(0.0, shapes[0], n)
+
+
+def _sample_expon(random_state, shapes, n):
+    return random_state.standard_exponential(n)
+
+
+def _sample_gamma(random_state, shapes, n):
+    return random_state.standard_gamma(shapes[0], n)
+
+
+def _sample_invgamma(random_state, shapes, n):
+    return 1.0 / random_state.standard_gamma(shapes[0], n)
+
+
+def _sample_beta(random_state, shapes, n):
+    return random_state.beta(shapes[0], shapes[1], n)
+
+
+# Standardized samplers (`loc` 0 and `scale` 1) of the `scipy.stats` distributions used in the
+# input parameters, with the number of shape parameters of each. They draw from the
+# `numpy.random.Generator` methods directly, without the overhead of `scipy.stats` `rvs()`.
+FAST_SAMPLERS = {
+    'norm': (_sample_norm, 0),
+    'lognorm': (_sample_lognorm, 1),
+    'expon': (_sample_expon, 0),
+    'gamma': (_sample_gamma, 1),
+    'invgamma': (_sample_invgamma, 1),
+    'beta': (_sample_beta, 2),
+}
+
+
+class Distribution:
+    """ A probability distribution compiled once from its specification, so it can be sampled
+    during the simulation without looking up the scipy distribution or parsing the parameters again.
+
+    :param str name: the name of the distribution in `scipy.stats`
+    :param tuple parameters: the shape parameters followed by `loc` and `scale`
+    :param random_state: the `numpy.random.Generator` used to sample, if `None` the global one is used
+    :param tuple bounds: the `(lower, upper)` support the values are truncated to, `None` for no bound
+    """
+
+    def __init__(self, name: str, parameters: tuple, random_state=None, bounds: tuple = None):
+        self.name = name
+        self.parameters = parameters
+        self.random_state = random_state
+        self.bounds = bounds
+        # Number of random values drawn out of `bounds` and replaced by a value in `bounds`
+        self.truncated = 0
+        self._compile()
+        # Pool of random values handed out one at a time, drawn lazily in blocks
+        self._pool = []
+        self._pool_size = SAMPLE_POOL_INITIAL_SIZE
+
+    @classmethod
+    def from_dict(cls, distribution: dict, random_state=None):
+        """Compiles a distribution with the format { \'name\': str, \'parameters\': tuple as a string }
+        and the optional \'bounds\': tuple as a string, e.g. "(0, None)" for positive values"""
+        parameters = make_tuple(distribution['parameters'])
+        if not isinstance(parameters, tuple):
+            parameters = (parameters,)
+        bounds = distribution.get('bounds')
+        if isinstance(bounds, str):
+            bounds = make_tuple(bounds)
+        if distribution['name'] == EmpiricalDistribution.NAME:
+            return EmpiricalDistribution(distribution['name'], parameters, random_state, bounds)
+        return cls(distribution['name'], parameters, random_state, bounds)
+
+    def _compile(self):
+        """Freezes the `scipy.stats` distribution with its parameters, and the probabilities
+        of its lower and upper bounds used to sample it truncated"""
+        dist = getattr(scipy.stats, self.name)
+        self._frozen = dist(*self.parameters[:-2], loc=self.parameters[-2], scale=self.parameters[-1])
+        self._fast_sampler = self._get_fast_sampler()
+        if self.bounds is not None:
+            self._lower, self._upper = _parse_bounds(self.bounds)
+            self._cdf_lower, self._cdf_upper = self._frozen.cdf([self._lower, self._upper])
+            if not self._cdf_lower < self._cdf_upper:
+                raise ValueError(f'{self} has no probability within the bounds {self.bounds}')
+
+    def rvs(self, n=1):
+        """Outputs `n` random values"""
+        values = self._draw(n)
+        if self.bounds is not None:
+            self._truncate(values)
+        return values
+
+    def _truncate(self, values):
+        """Replaces the values out of bounds by values drawn from the distribution truncated to
+        the bounds, by inverse CDF. As the values in bounds already follow the truncated
+        distribution, all the values are valid after a single pass."""
+        out_of_bounds = (values < self._lower) | (values > self._upper)
+        n = int(np.count_nonzero(out_of_bounds))
+        if n:
+            self.truncated += n
+            random_state = self.random_state if self.random_state is not None else np.random
+            values[out_of_bounds] = np.clip(
+                self._frozen.ppf(random_state.uniform(self._cdf_lower, self._cdf_upper, n)),
+                self._lower, self._upper)
+
+    def _draw(self, n):
+        """Draws `n` random values from the distribution, not truncated"""
+        if self._fast_sampler is not None:
+            loc, scale = self.parameters[-2:]
+            return loc + scale * self._fast_sampler(self.random_state, self.parameters[:-2], n)
+        return self._frozen.rvs(size=n, random_state=self.random_state)
+
+    def _get_fast_sampler(self):
+        """Returns the sampler of `FAST_SAMPLERS` for this distribution, or `None` to sample with
+        `scipy.stats` when the distribution is not in the table or the `random_state` is not a
+        `numpy.random.Generator`"""
+        if self.name not in FAST_SAMPLERS or not isinstance(self.random_state, np.random.Generator):
+            return None
+        sampler, n_shapes = FAST_SAMPLERS[self.name]
+        if len(self.parameters) != n_shapes + 2:
+            return None
+        lower, upper = self._frozen.support()
+        if not lower < upper:
+            # Invalid parameters (scipy reports a `nan` support), leave them to scipy to raise the usual error
+            return None
+        return sampler
+
+    def sample(self):
+        """Outputs a single random value taken from the pool, refilling it when it is empty"""
+        if not self._pool:
+            self._refill()
+        return self._pool.pop()
+
+    def _refill(self):
+        """Draws a new block of random values into the pool. Blocks grow up to
+        `SAMPLE_POOL_MAX_SIZE`, so rarely used distributions do not hold large pools."""
+        self._pool.extend(self.rvs(self._pool_size).tolist())
+        self._pool_size = min(2 * self._pool_size, SAMPLE_POOL_MAX_SIZE)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}({self.name} {self.parameters})>'
+
+
+class EmpiricalDistribution(Distribution):
+    """ A distribution of raw measurements, e.g. a ping trace or a CSV file of stage timings,
+    sampled without fitting a parametric distribution first. The measurements are read once
+    into a sorted array, so each value is drawn in constant time.
+
+    Its parameters are the path of the measurements file (relative to the working directory)
+    and optionally the sampling mode:
+
+    - `inverse_cdf` (default): interpolates the empirical quantile function at a uniform value
+    - `bootstrap`: picks one of the measurements with replacement
+
+    E.g. { 'name': 'empirical', 'parameters': "('raw-measurements/ping/Ireland-Ohio.txt', 'bootstrap')" }
+    """
+
+    NAME = 'empirical'
+    MODES = ('inverse_cdf', 'bootstrap')
+
+    def _compile(self):
+        if len(self.parameters) not in (1, 2):
+            raise TypeError(
+                f'Empirical distribution parameters must be (path,) or (path, mode), not {self.parameters}')
+        self.mode = self.parameters[1] if len(self.parameters) == 2 else self.MODES[0]
+        if self.mode not in self.MODES:
+            raise ValueError(f'Empirical distribution mode must be one of {self.MODES}, not {self.mode!r}')
+        if self.random_state is None:
+            self.random_state = np.random.default_rng()
+        self.values = load_measurements(self.parameters[0])
+        if self.bounds is not None:
+            # Measurements out of bounds are never sampled, so values never have to be truncated
+            lower, upper = _parse_bounds(self.bounds)
+            self.values = self.values[(self.values >= lower) & (self.values <= upper)]
+            if not len(self.values):
+                raise ValueError(f'{self} has no measurements within the bounds {self.bounds}')
+
+    def rvs(self, n=1):
+        """Outputs `n` random values, always within the bounds as the measurements are filtered"""
+        return self._draw(n)
+
+    def _draw(self, n):
+        if self.mode == 'bootstrap':
+            return self.values[self.random_state.integers(len(self.values), size=n)]
+        positions = self.random_state.random(n) * (len(self.values) - 1)
+        lower = positions.astype(np.intp)
+        upper = np.minimum(lower + 1, len(self.values) - 1)
+        weights = positions - lower
+        return self.values[lower] * (1 - weights) + self.values[upper] * weights
+
+
+def _parse_bounds(bounds):
+    """Returns the `(lower, upper)` bounds of a distribution, replacing a `None` bound by infinity"""
+    lower, upper = bounds
+    lower = -np.inf if lower is None else lower
+    upper = np.inf if upper is None else upper
+    if not lower < upper:
+        raise ValueError(f'The lower bound must be less than the upper bound, not {bounds}')
+    return lower, upper
+
+
+# Measurements already read by `load_measurements`, by absolute file path
+_measurements = {}
+
+
+def load_measurements(file_path):
+    """Reads a file of measurements into a sorted array, only once per file.
+    It reads the `time=X ms` values of a ping trace, otherwise the last number of each line
+    of a CSV file (lines without a number, such as headers, are skipped)."""
+    file_path = Path(file_path).resolve()
+    values = _measurements.get(file_path)
+    if values is None:
+        with open(file_path) as f:
+            lines = f.read().splitlines()
+        values = [float(match.group(1)) for match in map(_PING_TIME.search, lines) if match]
+        if not values:
+            for line in lines:
+                try:
+                    values.append(float(line.split(',')[-1]))
+                except ValueError:
+                    continue
+        if not values:
+            raise ValueError(f'No measurements found in {file_path}')
+        values = np.sort(np.array(values))
+        values.flags.writeable = False
+        _measurements[file_path] = values
+    return values
+
+
+class CompositeDelay:
+    """ The one-way delay of a message through a link between two locations: the upload
+    (`THROUGHPUT_SENT`), the propagation (`LATENCIES`) and the download (`THROUGHPUT_RECEIVED`)
+    delays. The three are drawn at once, in blocks, into a pool of joint samples, so a
+    delivery only takes one sample whatever the size of the message.
+
+    :param Distribution throughput_sent: the upload throughput of the link, in Mbps
+    :param Distribution latency: the latency of the link, in ms
+    :param Distribution throughput_received: the download throughput of the link, in Mbps
+    """
+
+    def __init__(self, throughput_sent, latency, throughput_received):
+        self._distributions = (throughput_sent, latency, throughput_received)
+        self._pool = []
+        self._pool_size = SAMPLE_POOL_INITIAL_SIZE
+
+    def sample(self, message_size: float):
+        """Outputs the `(sent_delay, latency_delay, received_delay)` in seconds of a message
+        with `message_size` megabytes (MB)"""
+        if not self._pool:
+            self._refill()
+        throughput_sent, latency, throughput_received = self._pool.pop()
+        megabits = message_size * 8
+        # Convert latency in ms to seconds
+        return round(megabits / throughput_sent, 3), round(latency / 1000, 4), round(megabits / throughput_received, 3)
+
+    def sample_many(self, message_size: float, n: int):
+        """Outputs the delays of `n` messages with `message_size` megabytes (MB), as a list of
+        tuples, in the order `sample` would output them"""
+        samples = []
+        while len(samples) < n:
+            if not self._pool:
+                self._refill()
+            k = min(n - len(samples), len(self._pool))
+            samples.extend(reversed(self._pool[-k:]))
+            del self._pool[-k:]
+        if not samples:
+            return []
+        throughput_sent, latency, throughput_received = np.array(samples).T
+        megabits = message_size * 8
+        # Convert latency in ms to seconds
+        return list(zip(np.round(megabits / throughput_sent, 3).tolist(), np.round(latency / 1000, 4).tolist(),
+                        np.round(megabits / throughput_received, 3).tolist()))
+
+    def _refill(self):
+        """Draws a new block of joint samples into the pool, growing up to `SAMPLE_POOL_MAX_SIZE`"""
+        self._pool.extend(zip(*(distribution.rvs(self._pool_size).tolist()
+                                for distribution in self._distributions)))
+        self._pool_size = min(2 * self._pool_size, SAMPLE_POOL_MAX_SIZE)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}{self._distributions}>'
+
+
+def compile_distribution(distribution, random_state=None):
+    """Returns `distribution` as a `Distribution`, compiling it when given as a dictionary.
+    A dictionary is compiled to sample with the `random_state` generator."""
+    if isinstance(distribution, Distribution):
+        return distribution
+    return Distribution.from_dict(distribution, random_state)
+
+
+def get_random_values(distribution, n=1, random_state=None):
     """Receives a `distribution` and outputs `n` random values
-    Distribution format: { \'name\': str, \'parameters\': tuple }"""
-    dist = getattr(scipy.stats, distribution['name'])
-    param = make_tuple(distribution['parameters'])
-    return dist.rvs(*param[:-2], loc=param[-2], scale=param[-1], size=n)
+    Distribution format: { \'name\': str, \'parameters\': tuple } or a compiled `Distribution`"""
+    return compile_distribution(distribution, random_state).rvs(n)
+
+
+class SequentialId(int):
+    """ A compact integer identity used instead of a hash in the `sequential` identity mode.
+    Slicing it slices its decimal representation, as a hash string would be sliced, so the
+    short hashes used in logs (e.g. `tx.hash[:8]`) keep working. The propagation monitors use
+    the whole identity instead, see `monitor_key`."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return str(int(self))[key]
+
+
+def set_identity_mode(mode: str):
+    """Sets how transactions and block headers are identified, one of `IDENTITY_MODES`:
+
+    - `keccak`: the Keccak 256 hash of the object, as a hex string
+    - `sequential`: a `SequentialId` from a global counter, without hashing
+
+    Setting the mode also restarts the counter, so each simulation gets the same identities
+    whatever ran before it in the process.
+    """
+    global _identity_mode, _next_sequential_id
+    if mode not in IDENTITY_MODES:
+        raise ValueError(f'Identity mode must be one of {IDENTITY_MODES}, not {mode!r}')
+    _identity_mode = mode
+    _next_sequential_id = 1
+
+
+def get_identity(obj, sequential_id=None):
+    """Returns a new identity for `obj` in the current identity mode. In the `sequential` mode
+    the identity is the next value of the counter, unless a fixed `sequential_id` is given."""
+    if _identity_mode == 'sequential':
+        if sequential_id is None:
+            sequential_id = get_sequential_ids(1).start
+        return SequentialId(sequential_id)
+    return encode_hex(keccak_256(str(obj).encode('utf-8')))
+
+
+def get_sequential_ids(n: int):
+    """Takes the next `n` values of the global counter of sequential identities, as a `range`"""
+    global _next_sequential_id
+    ids = range(_next_sequential_id, _next_sequential_id + n)
+    _next_sequential_id += n
+    return ids
+
+
+def skip_sequential_ids(identities):
+    """Moves the global counter past the `SequentialId`s in `identities`, e.g. the blocks of the
+    chains restored from the previous day, so the new identities do not collide with them"""
+    global _next_sequential_id
+    for identity in identities:
+        if isinstance(identity, SequentialId) and identity >= _next_sequential_id:
+            _next_sequential_id = int(identity) + 1
+
+
+def monitor_key(identity):
+    """Key of a transaction or a block in the propagation monitors: the first 8 characters of its
+    hash, or its whole `SequentialId`, whose first digits are shared past 10^8 identities"""
+    if isinstance(identity, SequentialId):
+        return str(int(identity))
+    return identity[:8]
 
 
 def decode_hex(s):
@@ -1,7 +1,15 @@
 import json
 from datetime import datetime
+from time import perf_counter
 import simpy
-from schema import Schema, SchemaError
+from schema import Schema, SchemaError, Optional
+from blocksim.utils import compile_distribution, set_identity_mode, Distribution, CompositeDelay
+from blocksim.rng import RandomStreams
+from blocksim.models.transaction_table import TransactionTable
+from blocksim.profiler import Profiler, ProfiledEnvironment
+
+# Throughputs are truncated to positive values, so a message is never sent or received with a negative delay
+THROUGHPUT_BOUNDS = (0, None)
 
 
 class SimulationWorld:
@@ -13,17 +21,26 @@ class SimulationWorld:
                  measured_throughput_received,
                  measured_throughput_sent,
                  measured_delays,
-                 day: int=0):
+                 day: int=0,
+                 seed=None):
         self._measured_delays = self._read_json_file(measured_delays)
         self._sim_duration = sim_duration
         self._initial_time = initial_time
-        self._config = self._read_json_file(config_file)
+        # The configuration can also be given as a dict, e.g. a base configuration with overrides
+        self._config = config_file if isinstance(config_file, dict) else self._read_json_file(config_file)
         self._measured_latency = measured_latency
         self._measured_throughput_received = measured_throughput_received
         self._measured_throughput_sent = measured_throughput_sent
+        # Conditions that stop the simulation before the end of its duration: (reason, predicate)
+        self._stop_conditions = []
+        self._stopping = False
         # Set the SimPy Environment
-        self._env = simpy.Environment(initial_time=self._initial_time)
+        self._set_environment()
+        # Called by the chains whenever a block is added, see `stop_when`
+        self._env.check_stop_conditions = self._check_stop_conditions
         self._set_configs()
+        self._set_random_streams(seed)
+        self._set_transaction_store()
         self._set_delays()
         self._set_latencies()
         self._set_throughputs()
@@ -38,7 +55,9 @@ class SimulationWorld:
             'block_propagation': {},
             'international_transactions': 0,
             # Jiali: add day to record the day from which the tx are imported.
-            'day': 'DAY ' + str(day) + ' '
+            'day': 'DAY ' + str(day) + ' ',
+            # The seed that reproduces this simulation
+            'seed': self._env.rng.seed
         }
 
     @property
@@ -53,14 +72,108 @@ class SimulationWorld:
     def env(self):
         return self._env
 
+    @property
+    def rng(self):
+        return self._env.rng
+
+    def stop_when(self, predicate, reason: str):
+        """Stops the simulation as soon as `predicate()` holds, see `blocksim.termination`. The
+        conditions are checked when the simulation starts and whenever a block is added to a
+        chain, so the simulation stops at the exact time the condition starts to hold"""
+        self._stop_conditions.append((reason, predicate))
+
     def start_simulation(self):
         end = self._initial_time + self._sim_duration
-        self._env.run(until=end)
+        termination = self._env.config.get('termination', {})
+        wall_clock_budget = termination.get('wall_clock_seconds')
+        if wall_clock_budget is not None:
+            self._env.process(self._check_wall_clock(termination.get('check_interval', 1), wall_clock_budget, end))
+        self._check_stop_conditions()
+        if self._env.profiler is None:
+            reason = self._env.run(until=end)
+        else:
+            reason = self._env.profiler.run(until=end)
+            self._env.data['profile'] = self._env.profiler.report()
+        if reason is not None:
+            self._env.data['end_simulation_time'] = datetime.utcfromtimestamp(
+                self._env.now).strftime('%m-%d %H:%M:%S')
+        self._env.data['termination'] = reason or 'duration'
+        self._env.data['truncated_samples'] = self.truncated_samples()
+
+    def _check_stop_conditions(self):
+        """Stops the simulation once one of the stop conditions holds"""
+        if self._stopping or not self._stop_conditions:
+            return
+        reason = next((reason for reason, predicate in self._stop_conditions if predicate()), None)
+        if reason is not None:
+            self._stop(reason)
+
+    def _check_wall_clock(self, interval, wall_clock_budget, end):
+        """Checks every `interval` simulated seconds whether the simulation took `wall_clock_budget`
+        seconds, and stops it then"""
+        start = perf_counter()
+        while self._env.now < end and not self._stopping:
+            if perf_counter() - start >= wall_clock_budget:
+                self._stop('wall_clock_budget')
+                return
+            yield self._env.timeout(interval)
+
+    def _stop(self, reason: str):
+        """Stops the SimPy loop right away, with the `reason` as the value returned by `run`"""
+        self._stopping = True
+        stop = self._env.event()
+        stop.callbacks.append(simpy.core.StopSimulation.callback)
+        stop.succeed(reason)
+
+    def truncated_samples(self, distributions=None):
+        """Returns how many random values were drawn out of bounds and truncated, for each
+        distribution that had any (e.g. the throughput of each link between two locations)"""
+        if distributions is None:
+            distributions = self._env.delays
+        if isinstance(distributions, Distribution):
+            return distributions.truncated
+        if not isinstance(distributions, dict):
+            # The composite delays are made of distributions that are already counted
+            return 0
+        counts = {}
+        for name, value in distributions.items():
+            count = self.truncated_samples(value)
+            if count:
+                counts[name] = count
+        return counts
+
+    def _set_environment(self):
+        """Creates the SimPy environment, instrumented by a `Profiler` when the configuration sets
+        `"profile": true`"""
+        if self._config.get('profile', False):
+            self._env = ProfiledEnvironment(initial_time=self._initial_time)
+            self._env.profiler = Profiler(self._env)
+        else:
+            self._env = simpy.Environment(initial_time=self._initial_time)
+            self._env.profiler = None
 
     def _set_configs(self):
         """Injects the different configuration variables to the environment variable to be
         used during the simulation"""
         self._env.config = self._config
+        set_identity_mode(self._config.get('identity', 'keccak'))
+
+    def _set_random_streams(self, seed):
+        """Injects the random number generation service in the environment variable. The `seed`
+        argument takes precedence over the `seed` in the configuration file"""
+        if seed is None:
+            seed = self._config.get('seed')
+        self._env.rng = RandomStreams(seed)
+
+    def _set_transaction_store(self):
+        """Injects the columnar `TransactionTable` in the environment variable when the configuration
+        sets `"transaction_store": "table"`, otherwise transactions are `Transaction` objects"""
+        transaction_store = self._config.get('transaction_store', 'objects')
+        if transaction_store not in ('objects', 'table'):
+            raise ValueError(f'Transaction store must be "objects" or "table", not {transaction_store!r}')
+        if transaction_store == 'table' and self.blockchain != 'pbft':
+            raise RuntimeError('The transaction table is only supported by the pbft blockchain')
+        self._env.transactions = TransactionTable() if transaction_store == 'table' else None
 
     def _set_delays(self):
         """Injects the probability distribution delays in the environment variable to be
@@ -78,34 +191,35 @@ class SimulationWorld:
             self._measured_delays['pbft']['tx_validation'],
             self._measured_delays['pbft']['block_validation'],
             self._measured_delays['pbft']['time_between_blocks_seconds'])
-        self._env.delays = self._measured_delays['pbft']
+        self._env.delays = self._compile_distributions(self._measured_delays['pbft'], 'delays')
 
     def _set_poa_delays(self):
         self._validate_distribution(
             self._measured_delays['poa']['tx_validation'],
             self._measured_delays['poa']['block_validation'],
             self._measured_delays['poa']['time_between_blocks_seconds'])
-        self._env.delays = self._measured_delays['poa']
+        self._env.delays = self._compile_distributions(self._measured_delays['poa'], 'delays')
 
     def _set_bitcoin_delays(self):
         self._validate_distribution(
             self._measured_delays['bitcoin']['tx_validation'],
             self._measured_delays['bitcoin']['block_validation'],
             self._measured_delays['bitcoin']['time_between_blocks_seconds'])
-        self._env.delays = self._measured_delays['bitcoin']
+        self._env.delays = self._compile_distributions(self._measured_delays['bitcoin'], 'delays')
 
     def _set_ethereum_delays(self):
         self._validate_distribution(
             self._measured_delays['ethereum']['tx_validation'],
             self._measured_delays['ethereum']['block_validation'],
             self._measured_delays['ethereum']['time_between_blocks_seconds'])
-        self._env.delays = self._measured_delays['ethereum']
+        self._env.delays = self._compile_distributions(self._measured_delays['ethereum'], 'delays')
 
     def _set_latencies(self):
         """Reads the file with the latencies measurements taken"""
         data = self._read_json_file(self._measured_latency)
         self._locations = list(data['locations'])
-        self._env.delays.update(dict(LATENCIES=data['locations']))
+        self._env.delays.update(dict(
+            LATENCIES=self._compile_distributions(data['locations'], 'LATENCIES')))
 
     def _set_throughputs(self):
         """Reads the measured throughputs and pass it to the environment variable to be
@@ -121,21 +235,50 @@ class SimulationWorld:
                 "The locations in latencies measurements are not equal in throughputs measurements")
         # Pass the throughputs to the environment variable
         self._env.delays.update(dict(
-            THROUGHPUT_RECEIVED=throughput_received['locations'],
-            THROUGHPUT_SENT=throughput_sent['locations']
+            THROUGHPUT_RECEIVED=self._compile_distributions(
+                throughput_received['locations'], 'THROUGHPUT_RECEIVED', bounds=THROUGHPUT_BOUNDS),
+            THROUGHPUT_SENT=self._compile_distributions(
+                throughput_sent['locations'], 'THROUGHPUT_SENT', bounds=THROUGHPUT_BOUNDS)
         ))
+        self._set_composite_delays()
+
+    def _set_composite_delays(self):
+        """Joins the upload throughput, latency and download throughput of each link between two
+        locations, so the three delays of a message are drawn together"""
+        delays = self._env.delays
+        self._env.delays['COMPOSITE'] = {
+            origin: {
+                destination: CompositeDelay(
+                    delays['THROUGHPUT_SENT'][origin][destination],
+                    delays['LATENCIES'][origin][destination],
+                    delays['THROUGHPUT_RECEIVED'][origin][destination])
+                for destination in self.locations}
+            for origin in self.locations}
 
     def _validate_distribution(self, *distributions: dict):
         for distribution in distributions:
             distribution_schema = Schema({
                 'name': str,
-                'parameters': str
+                'parameters': str,
+                Optional('bounds'): str
             })
             try:
                 distribution_schema.validate(distribution)
             except SchemaError:
                 raise TypeError(
-                    'Probability distribution must follow this schema: { \'name\': str, \'parameters\': tuple as a string }')
+                    'Probability distribution must follow this schema: { \'name\': str, \'parameters\': tuple as a string, \'bounds\' (optional): tuple as a string }')
+
+    def _compile_distributions(self, distributions: dict, *key, bounds=None):
+        """Compiles every probability distribution once, including the ones indexed by origin
+        and destination locations, so they are not parsed again each time a delay is sampled.
+        Each distribution samples from its own random stream, identified by its `key` path.
+        The `bounds` are used for the distributions without their own bounds."""
+        if 'name' in distributions:
+            if bounds is not None and 'bounds' not in distributions:
+                distributions = dict(distributions, bounds=bounds)
+            return compile_distribution(distributions, self._env.rng.stream(*key))
+        return {name: self._compile_distributions(value, *key, name, bounds=bounds)
+                for name, value in distributions.items()}
 
     def _read_json_file(self, file_location):
         with open(file_location) as f:
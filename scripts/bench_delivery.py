@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+# Runs from the root of the repository, e.g. `python scripts/bench_delivery.py`, without installing blocksim
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from time import perf_counter
+import numpy as np
+from types import SimpleNamespace
+from simpy import Environment, Store
+from blocksim.models.network import Connection
+
+# Number of connections (a full mesh of 16 nodes) and of messages sent through each of them
+CONNECTIONS = 16 * 15
+MESSAGES = 500
+
+
+class CountingEnvironment(Environment):
+    """Environment that counts the events it processes"""
+
+    def __init__(self):
+        super().__init__()
+        self.config = {'verbose': False}
+        self.processed = 0
+
+    def step(self):
+        self.processed += 1
+        super().step()
+
+
+def process_delivery(env, connection, envelope, delay):
+    """Delivery of a message with a process, as done before by `Connection`"""
+    yield env.timeout(delay)
+    connection.destination_node.inbox.put(envelope)
+
+
+def run(use_processes: bool, seed=0):
+    """Sends `MESSAGES` messages through each connection, with random latencies, and returns the
+    number of processed events and the wall-clock seconds of the simulation"""
+    env = CountingEnvironment()
+    rng = np.random.default_rng(seed)
+    node = SimpleNamespace(inbox=Store(env), in_flight=0)
+    connections = [Connection(env, None, node) for _ in range(CONNECTIONS)]
+    received = [0]
+
+    def listen():
+        while True:
+            yield node.inbox.get()
+            received[0] += 1
+
+    def send(connection, delays):
+        for envelope, delay in enumerate(delays):
+            if use_processes:
+                env.process(process_delivery(env, connection, envelope, delay))
+            else:
+                connection.deliver(envelope, delay, 0)
+            yield env.timeout(0.001)
+
+    env.process(listen())
+    for connection in connections:
+        connection.open()
+        env.process(send(connection, rng.uniform(0.01, 0.2, MESSAGES).round(4)))
+    start = perf_counter()
+    env.run()
+    assert received[0] == CONNECTIONS * MESSAGES
+    return env.processed, perf_counter() - start
+
+
+if __name__ == '__main__':
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    for name, use_processes in (('process', True), ('callback', False)):
+        events, seconds = run(use_processes, seed)
+        print(f'{name:8} {events} events in {seconds:.2f} s: {events / seconds:,.0f} events/s, '
+              f'{CONNECTIONS * MESSAGES / seconds:,.0f} messages/s')
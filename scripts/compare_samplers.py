@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+# Runs from the root of the repository, e.g. `python scripts/compare_samplers.py`, without installing blocksim
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import numpy as np
+from scipy import stats
+from blocksim.utils import Distribution, FAST_SAMPLERS, load_measurements
+
+# A distribution of every family in `FAST_SAMPLERS`, with parameters taken from the input parameters
+DISTRIBUTIONS = [
+    ('norm', (23.41, 1.61)),
+    ('lognorm', (0.5, 0.0016, 0.0048)),
+    ('expon', (0, 10)),
+    ('gamma', (1.54, 0.0071, 0.0115)),
+    ('invgamma', (12.86, -0.0016, 0.1137)),
+    ('beta', (2.07, 3.36, 0.0031, 0.0425)),
+]
+# Bounded empirical distributions, sampled from the measurements within the bounds
+EMPIRICAL = [
+    ('raw-measurements/ping/Ireland-Ohio.txt', 'inverse_cdf', (None, 84.75)),
+    ('raw-measurements/ping/Ireland-Ohio.txt', 'bootstrap', (84.65, None)),
+]
+N = 200000
+# Maximum difference allowed between the sample moments and scipy's, in standard errors
+TOLERANCE = 5
+# Minimum p-value of the Kolmogorov-Smirnov test of the values against scipy's CDF
+KS_SIGNIFICANCE = 0.001
+
+
+def check_moments(name, parameters, n=N, seed=0):
+    """Compares the mean and variance of `n` values drawn by the fast sampler of `name` with the
+    exact moments of the `scipy.stats` distribution, and runs a Kolmogorov-Smirnov test against its CDF"""
+    distribution = Distribution(name, parameters, np.random.default_rng(seed))
+    assert distribution._fast_sampler is not None, f'{name} is not sampled by a fast sampler'
+    values = distribution.rvs(n)
+    frozen = distribution._frozen
+    mean, var = frozen.mean(), frozen.var()
+    mean_error = abs(values.mean() - mean) / np.sqrt(var / n)
+    # The standard error of the sample variance needs the fourth central moment
+    kurtosis = frozen.stats(moments='k')
+    var_error = abs(values.var() - var) / (var * np.sqrt((kurtosis + 2) / n))
+    _, p_value = stats.kstest(values, frozen.cdf)
+    print(f'{name:9} mean {values.mean():.6g} ({mean:.6g}) var {values.var():.6g} ({var:.6g}) KS p-value {p_value:.3f}')
+    assert mean_error < TOLERANCE, f'{name} mean is {mean_error:.1f} standard errors away from scipy'
+    assert var_error < TOLERANCE, f'{name} variance is {var_error:.1f} standard errors away from scipy'
+    assert p_value > KS_SIGNIFICANCE, f'{name} values do not follow the scipy distribution (KS p-value {p_value:.2g})'
+
+
+def check_empirical(path, mode, bounds, n=N, seed=0):
+    """Checks that `n` values drawn from the empirical distribution of the measurements in `path`,
+    bounded by `bounds`, are within the bounds and have the mean of the measurements within them"""
+    distribution = Distribution.from_dict(
+        {'name': 'empirical', 'parameters': repr((path, mode)), 'bounds': repr(bounds)}, np.random.default_rng(seed))
+    values = distribution.rvs(n)
+    measurements = load_measurements(path)
+    lower = -np.inf if bounds[0] is None else bounds[0]
+    upper = np.inf if bounds[1] is None else bounds[1]
+    measurements = measurements[(measurements >= lower) & (measurements <= upper)]
+    mean_error = abs(values.mean() - measurements.mean()) / np.sqrt(measurements.var() / n)
+    print(f'empirical {mode} {bounds} mean {values.mean():.6g} ({measurements.mean():.6g})')
+    assert lower <= values.min() and values.max() <= upper, f'empirical {mode} values are out of {bounds}'
+    assert distribution.sample() is not None
+    # Interpolating between the measurements smooths the distribution, so only bootstrap keeps the mean exactly
+    if mode == 'bootstrap':
+        assert mean_error < TOLERANCE, f'empirical mean is {mean_error:.1f} standard errors away from the measurements'
+
+
+if __name__ == '__main__':
+    assert {name for name, _ in DISTRIBUTIONS} == set(FAST_SAMPLERS)
+    for name, parameters in DISTRIBUTIONS:
+        check_moments(name, parameters)
+    for path, mode, bounds in EMPIRICAL:
+        check_empirical(path, mode, bounds)